@@ -0,0 +1,122 @@
+"""
+Measures the template fills of several decks with and without the call policy
+of `agent_config.yaml` (timeouts, retries and hedging), against a stub model
+where `--slow-call-ratio` of the calls take `--slow-call-factor` times longer
+and `--error-ratio` of them fail with a transient 503 error.
+
+Without the policy, a slow call holds its slide (and, in ordered streaming,
+every slide after it) and a failed call drops the slide from the deck.
+
+Run from the `backend` folder:
+
+    python -m benchmarks.call_policy_benchmark
+    python -m benchmarks.call_policy_benchmark --decks 20 --slow-call-ratio 0.05 --error-ratio 0.05
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+os.environ.setdefault("TAVILY_API_KEY", "stub")
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+
+from src.logger import logger
+
+from generator.async_generator import AsyncSlideGenerator
+from generator.call_policy import CallPolicies
+
+from benchmarks.stubs import StubChatModel, StubAsyncTavilyClient, sample_presentation_content
+
+def percentile(values: list[float], quantile: float) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+
+    return statistics.quantiles(values, n=100, method="inclusive")[round(quantile * 100) - 1]
+
+def call_policy_config(generator: AsyncSlideGenerator, enabled: bool, args: argparse.Namespace) -> dict:
+    config = generator.agent_config["call_policy_config"]
+    if enabled:
+        template_fill = {**(config["stages"].get("template_fill") or {})}
+        if args.hedge_min_delay is not None:
+            template_fill["hedge_min_delay_seconds"] = args.hedge_min_delay
+        return {**config, "stages": {**config["stages"], "template_fill": template_fill}}
+
+    # A single attempt with no timeout and no hedging: each call as it was made before the policy.
+    return {"default": {**config["default"], "timeout_seconds": 1e9, "max_attempts": 1, "hedge": False}}
+
+async def run(generator: AsyncSlideGenerator, enabled: bool, args: argparse.Namespace) -> dict:
+    generator.llm = StubChatModel(
+        args.latency,
+        slow_call_ratio=args.slow_call_ratio,
+        slow_call_factor=args.slow_call_factor,
+        error_ratio=args.error_ratio,
+        seed=args.seed
+    )
+    generator.call_policies = CallPolicies(call_policy_config(generator, enabled, args))
+
+    fill_latencies: list[float] = []
+    fill_template = AsyncSlideGenerator.generate_one_template_content
+
+    async def timed_fill(slide_info: dict, class_topic: str, on_partial=None) -> dict:
+        start = time.perf_counter()
+        try:
+            return await fill_template(generator, slide_info, class_topic, on_partial)
+        finally:
+            fill_latencies.append(time.perf_counter() - start)
+
+    generator.generate_one_template_content = timed_fill
+
+    deck_latencies: list[float] = []
+    dropped_slides = 0
+    for _ in range(args.decks):
+        slides_content = [slide.model_dump() for slide in sample_presentation_content(args.n_slides).slides]
+
+        start = time.perf_counter()
+        filled_templates = await generator.generate_templates_content(slides_content, "Revolução Francesa")
+        deck_latencies.append(time.perf_counter() - start)
+        dropped_slides += len(slides_content) - len(filled_templates)
+
+    return {
+        "fill_latencies": fill_latencies,
+        "deck_latencies": deck_latencies,
+        "dropped_slides": dropped_slides,
+        "calls": len(generator.llm.usage),
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    logger.setLevel(logging.CRITICAL)
+
+    generator = AsyncSlideGenerator(llm=StubChatModel(), tavily_client=StubAsyncTavilyClient())
+    generator.max_concurrent_template_fills = args.max_concurrent_template_fills
+    generator.template_fill_cache = None
+
+    print(
+        f"decks={args.decks} n_slides={args.n_slides} latency={args.latency}s slow_call_ratio={args.slow_call_ratio} "
+        f"slow_call_factor={args.slow_call_factor} error_ratio={args.error_ratio} "
+        f"max_concurrent_template_fills={args.max_concurrent_template_fills}"
+    )
+    print(f"{'policy':>7} {'calls':>5} {'dropped':>7} {'fill p50':>8} {'fill p95':>8} {'fill p99':>8} {'deck p50':>8} {'deck p95':>8} {'deck p99':>8}")
+    for enabled in (False, True):
+        result = await run(generator, enabled, args)
+        fills, decks = result["fill_latencies"], result["deck_latencies"]
+        print(
+            f"{'on' if enabled else 'off':>7} {result['calls']:>5} {result['dropped_slides']:>7} "
+            f"{percentile(fills, 0.5):>8.2f} {percentile(fills, 0.95):>8.2f} {percentile(fills, 0.99):>8.2f} "
+            f"{percentile(decks, 0.5):>8.2f} {percentile(decks, 0.95):>8.2f} {percentile(decks, 0.99):>8.2f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--decks", type=int, default=10)
+    parser.add_argument("--n-slides", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.3, help="Latency of a regular stub LLM call, in seconds")
+    parser.add_argument("--slow-call-ratio", type=float, default=0.03, help="Share of the calls that are slow")
+    parser.add_argument("--slow-call-factor", type=float, default=10, help="How many times longer a slow call takes")
+    parser.add_argument("--error-ratio", type=float, default=0.02, help="Share of the calls that fail with a transient error")
+    parser.add_argument("--hedge-min-delay", type=float, default=None, help="Overrides hedge_min_delay_seconds of the template fills")
+    parser.add_argument("--max-concurrent-template-fills", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+
+    asyncio.run(main(parser.parse_args()))
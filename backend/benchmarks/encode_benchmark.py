@@ -0,0 +1,168 @@
+"""
+Micro-benchmark of the cost of encoding slides, with no LLM or network involved:
+`--concurrency` presentations of `--n-slides` content slides are encoded at the
+same time, interleaved on one event loop like simultaneous requests, and the
+CPU time per slide is reported for each path:
+
+- `stream`: the NEW_SLIDE events of `/streaming` (`Slide` construction and
+  `streaming_new_slide_event`), including the introduction, agenda and
+  conclusion slides.
+- `response`: the body of `/slide` for the whole presentation.
+
+Each path is measured as it is now (`current`) and as it was before the orjson
+and `TypeAdapter` fast path (`baseline`: every slide validated, `json.dumps`
+events and the `response_model` validation and encoding of FastAPI).
+
+Run from the `backend` folder:
+
+    python -m benchmarks.encode_benchmark
+    python -m benchmarks.encode_benchmark --n-slides 30 --concurrency 1 100 500 --rounds 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from models.types import Slide, SlideTypeEnum, SLIDES_ADAPTER
+
+from src.logger import logger
+
+from generator.utils import (
+    get_introduction_slide,
+    get_agenda_slide,
+    get_conclusion_slide,
+    build_static_slide,
+    CONCLUSION_SLIDE,
+    streaming_new_slide_event,
+    stream_introduction_slide,
+    stream_agenda_slide,
+    stream_conclusion_slide
+)
+
+PATHS = ["stream", "response"]
+
+def filled_templates(number_of_slides: int, deck: int) -> list[dict]:
+    return [
+        {
+            "templateID": 5,
+            "generationTemplate": {
+                "title": f"Causas da Revolução Francesa {deck}.{idx}",
+                "content": "A crise financeira, a desigualdade entre os estamentos e as ideias iluministas levaram à queda do Antigo Regime. " * 3,
+                "topics": ["Crise fiscal", "Estados Gerais", "Queda da Bastilha", "Declaração dos Direitos do Homem"],
+            },
+        }
+        for idx in range(number_of_slides)
+    ]
+
+def validated_slide(slide_type: SlideTypeEnum, template: dict) -> Slide:
+    return Slide(
+        type=slide_type,
+        title=template["generationTemplate"]["title"],
+        content={
+            "templateID": template["templateID"],
+            "templateContent": template["generationTemplate"]
+        }
+    )
+
+def baseline_event(slide: Slide, position: int | None = None) -> str:
+    data = slide.model_dump()
+    if position is not None:
+        data = {**data, "position": position}
+
+    return f"|NEW_SLIDE: {json.dumps(data, ensure_ascii=False)}|\n"
+
+def baseline_stream(topic: str, templates: list[dict]):
+    yield baseline_event(validated_slide(SlideTypeEnum.TITLE, get_introduction_slide(topic, f"Apresentação sobre {topic}")))
+    for position, template in enumerate(templates):
+        yield baseline_event(validated_slide(SlideTypeEnum.CONTENT, template), position)
+    yield baseline_event(validated_slide(SlideTypeEnum.AGENDA, get_agenda_slide([template["generationTemplate"]["title"] for template in templates])))
+    yield baseline_event(validated_slide(SlideTypeEnum.CONCLUSION, get_conclusion_slide()))
+
+def current_stream(topic: str, templates: list[dict]):
+    yield from stream_introduction_slide(topic)
+    for position, template in enumerate(templates):
+        yield streaming_new_slide_event(validated_slide(SlideTypeEnum.CONTENT, template), position)
+    yield from stream_agenda_slide([template["generationTemplate"]["title"] for template in templates])
+    yield from stream_conclusion_slide()
+
+def baseline_presentation(topic: str, templates: list[dict]) -> list[Slide]:
+    return [
+        validated_slide(SlideTypeEnum.TITLE, get_introduction_slide(topic, f"Apresentação sobre {topic}")),
+        validated_slide(SlideTypeEnum.AGENDA, get_agenda_slide([template["generationTemplate"]["title"] for template in templates])),
+        *(validated_slide(SlideTypeEnum.CONTENT, template) for template in templates),
+        validated_slide(SlideTypeEnum.CONCLUSION, get_conclusion_slide()),
+    ]
+
+def current_presentation(topic: str, templates: list[dict]) -> list[Slide]:
+    return [
+        build_static_slide(SlideTypeEnum.TITLE, get_introduction_slide(topic, f"Apresentação sobre {topic}")),
+        build_static_slide(SlideTypeEnum.AGENDA, get_agenda_slide([template["generationTemplate"]["title"] for template in templates])),
+        *(validated_slide(SlideTypeEnum.CONTENT, template) for template in templates),
+        CONCLUSION_SLIDE,
+    ]
+
+async def baseline_response(topic: str, templates: list[dict], response_field) -> bytes:
+    content = await serialize_response(field=response_field, response_content=baseline_presentation(topic, templates))
+    return JSONResponse(content).body
+
+async def current_response(topic: str, templates: list[dict], response_field) -> bytes:
+    return SLIDES_ADAPTER.dump_json(current_presentation(topic, templates))
+
+async def encode_deck(path: str, implementation: str, topic: str, templates: list[dict], response_field) -> int:
+    if path == "response":
+        encode = baseline_response if implementation == "baseline" else current_response
+        return len(await encode(topic, templates, response_field))
+
+    size = 0
+    for event in (baseline_stream if implementation == "baseline" else current_stream)(topic, templates):
+        size += len(event)
+        # Lets the other decks run between two events, as concurrent streams do.
+        await asyncio.sleep(0)
+    return size
+
+async def run(path: str, implementation: str, number_of_slides: int, concurrency: int, response_field) -> tuple[float, float, int]:
+    decks = [(f"Revolução Francesa {deck}", filled_templates(number_of_slides, deck)) for deck in range(concurrency)]
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    sizes = await asyncio.gather(*(encode_deck(path, implementation, topic, templates, response_field) for topic, templates in decks))
+    return time.perf_counter() - start, time.process_time() - cpu_start, sum(sizes)
+
+async def main(args: argparse.Namespace) -> None:
+    logger.setLevel(logging.WARNING)
+
+    from src.main import app
+
+    response_field = next(route.response_field for route in app.routes if getattr(route, "path", None) == "/slide")
+
+    print(f"{'path':>8} {'n_slides':>8} {'conc':>5} {'baseline (us/slide)':>20} {'current (us/slide)':>19} {'speedup':>8} {'bytes/deck':>11}")
+    for path in args.paths:
+        for number_of_slides in args.n_slides:
+            for concurrency in args.concurrency:
+                # Slides per deck, counting the introduction, agenda and conclusion.
+                slides = concurrency * (number_of_slides + 3)
+                cpu_per_slide = {}
+                for implementation in ("baseline", "current"):
+                    await run(path, implementation, number_of_slides, min(concurrency, 10), response_field)
+                    measurements = [await run(path, implementation, number_of_slides, concurrency, response_field) for _ in range(args.rounds)]
+                    cpu_per_slide[implementation] = statistics.median(cpu for _, cpu, _ in measurements) / slides
+                    size = measurements[-1][2] // concurrency
+
+                print(
+                    f"{path:>8} {number_of_slides:>8} {concurrency:>5} {cpu_per_slide['baseline'] * 1e6:>20.1f} "
+                    f"{cpu_per_slide['current'] * 1e6:>19.1f} {cpu_per_slide['baseline'] / cpu_per_slide['current']:>7.1f}x {size:>11}"
+                )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", choices=PATHS, nargs="+", default=PATHS)
+    parser.add_argument("--n-slides", type=int, nargs="+", default=[30])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50, 200])
+    parser.add_argument("--rounds", type=int, default=5, help="Measurements per combination (the median is reported)")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,111 @@
+"""
+Load benchmark: how many concurrent requests a single uvicorn worker holds open.
+
+Starts one uvicorn worker serving the stub application (see `benchmarks/stub_app.py`),
+fires batches of simultaneous requests and reports latency and the effective
+concurrency, i.e. how many requests were being served at the same time on average.
+
+Run from the `backend` folder:
+
+    python -m benchmarks.load_benchmark --mode async --concurrency 10 50 100 200
+    python -m benchmarks.load_benchmark --mode sync --concurrency 10 50 100 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+
+import httpx
+
+BACKEND_FOLDER = Path(__file__).resolve().parent.parent
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def start_server(mode: str, latency: float, port: int) -> subprocess.Popen:
+    env = {**os.environ, "BENCH_MODE": mode, "BENCH_LLM_LATENCY": str(latency)}
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "benchmarks.stub_app:create_app", "--factory",
+            "--port", str(port), "--workers", "1", "--log-level", "warning", "--no-access-log"
+        ],
+        cwd=BACKEND_FOLDER,
+        env=env
+    )
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            await client.get("/docs")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+
+    raise RuntimeError("Benchmark server did not start in time.")
+
+async def timed_request(client: httpx.AsyncClient, endpoint: str, payload: dict) -> float:
+    start = time.perf_counter()
+    if endpoint == "/streaming":
+        async with client.stream("POST", endpoint, json=payload) as response:
+            response.raise_for_status()
+            async for _ in response.aiter_bytes():
+                pass
+    else:
+        response = await client.post(endpoint, json=payload)
+        response.raise_for_status()
+
+    return time.perf_counter() - start
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, payload: dict, concurrency: int) -> dict:
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed_request(client, endpoint, payload) for _ in range(concurrency)))
+    wall_time = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "wall_time": wall_time,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "effective_concurrency": sum(latencies) / wall_time,
+        "throughput": concurrency / wall_time,
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    server = start_server(args.mode, args.latency, args.port)
+    payload = {"topic": "Revolução Francesa", "grade": "Ensino Médio", "context": "", "n_slides": args.n_slides}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None, limits=limits) as client:
+            await wait_until_ready(client)
+
+            print(f"mode={args.mode} endpoint={args.endpoint} n_slides={args.n_slides} stub_latency={args.latency}s")
+            print(f"{'concurrency':>11} {'wall (s)':>9} {'p50 (s)':>8} {'p95 (s)':>8} {'in flight':>9} {'req/s':>7}")
+            for concurrency in args.concurrency:
+                result = await run_level(client, args.endpoint, payload, concurrency)
+                print(
+                    f"{result['concurrency']:>11} {result['wall_time']:>9.2f} {result['p50']:>8.2f} "
+                    f"{result['p95']:>8.2f} {result['effective_concurrency']:>9.1f} {result['throughput']:>7.1f}"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--endpoint", choices=["/slide", "/streaming"], default="/slide")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--n-slides", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latency of each stub LLM/search call, in seconds")
+    parser.add_argument("--port", type=int, default=8765)
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,209 @@
+"""
+Offline benchmark of the whole pipeline, from the lesson plan to the last slide,
+with the stub LLM and search clients (see `benchmarks/stubs.py`). No API key or
+network access is needed.
+
+Each scenario runs batches of simultaneous generations for every combination of
+`--n-slides` and `--concurrency`:
+
+- `generate_presentation`: `generate_lesson_plan` and `generate_presentation` of `AsyncSlideGenerator`.
+- `generate_presentation_stream`: the same, consuming `generate_presentation_stream`.
+- `/slide` and `/streaming`: the HTTP endpoints of `src.main.app`, served in process (ASGI).
+
+and reports the throughput, the latency percentiles, the CPU time per generation
+and, with `--trace-memory`, the peak of memory allocated during the batch. Stub
+latencies are drawn from `--latency` (`kind:mean[:spread]`, see
+`LatencyDistribution`) with a fixed `--seed`, so two runs make the same calls
+with the same latencies; `--latency 0` leaves only the overhead of the pipeline
+itself. `--output` writes the results, along with the commit they were measured
+on, as JSON to be compared across commits.
+
+Caches are disabled and every generation has its own topic, so that nothing is
+reused or coalesced. Rate limits are disabled unless `--rate-limits` is given.
+
+Run from the `backend` folder:
+
+    python -m benchmarks.pipeline_benchmark
+    python -m benchmarks.pipeline_benchmark --latency 0 --n-slides 1 10 30 --concurrency 1 20
+    python -m benchmarks.pipeline_benchmark --latency lognormal:0.8:0.4 --trace-memory --output results.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import platform
+import resource
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from pathlib import Path
+
+import httpx
+
+from src.logger import logger
+
+from generator.rate_limit import RateLimiters
+from generator.call_policy import CallPolicies
+from generator.async_generator import AsyncSlideGenerator
+
+from benchmarks.stub_app import create_async_app
+from benchmarks.stubs import LatencyDistribution, StubChatModel, StubAsyncTavilyClient
+from benchmarks.load_benchmark import percentile
+
+BACKEND_FOLDER = Path(__file__).resolve().parent.parent
+
+SCENARIOS = ["generate_presentation", "generate_presentation_stream", "/slide", "/streaming"]
+
+def git_revision() -> dict:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], cwd=BACKEND_FOLDER, capture_output=True, text=True).stdout.strip()
+
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+def without_rate_limits(generator: AsyncSlideGenerator) -> None:
+    generator.rate_limiters = RateLimiters({})
+    generator.web_search_rate_limiter = None
+    generator.call_policies = CallPolicies(generator.agent_config["call_policy_config"])
+
+def reset_stubs(generator: AsyncSlideGenerator, args: argparse.Namespace) -> None:
+    """
+    Fresh stub clients for each batch, so that every batch sees the same latencies.
+    """
+    generator.llm = StubChatModel(args.latency, args.output_token_latency, seed=args.seed)
+    generator.tavilyClient = StubAsyncTavilyClient(args.search_latency, seed=args.seed)
+
+def payload(idx: int, number_of_slides: int) -> dict:
+    return {"topic": f"Revolução Francesa {idx}", "grade": "Ensino Médio", "context": "", "n_slides": number_of_slides}
+
+async def run_generation(generator: AsyncSlideGenerator, scenario: str, request: dict) -> None:
+    lesson_plan = await generator.generate_lesson_plan(request["topic"], request["grade"], request["context"])
+
+    if scenario == "generate_presentation":
+        await generator.generate_presentation(lesson_plan, request["topic"], request["n_slides"])
+    else:
+        async for _ in generator.generate_presentation_stream(lesson_plan, request["topic"], request["n_slides"]):
+            pass
+
+async def run_request(client: httpx.AsyncClient, scenario: str, request: dict) -> None:
+    if scenario == "/streaming":
+        async with client.stream("POST", scenario, json=request) as response:
+            response.raise_for_status()
+            async for _ in response.aiter_bytes():
+                pass
+    else:
+        response = await client.post(scenario, json=request)
+        response.raise_for_status()
+
+async def run_batch(generator: AsyncSlideGenerator, client: httpx.AsyncClient, scenario: str, number_of_slides: int, concurrency: int, args: argparse.Namespace) -> dict:
+    reset_stubs(generator, args)
+
+    async def timed(idx: int) -> float:
+        request = payload(idx, number_of_slides)
+        start = time.perf_counter()
+        if scenario.startswith("/"):
+            await run_request(client, scenario, request)
+        else:
+            await run_generation(generator, scenario, request)
+        return time.perf_counter() - start
+
+    if args.trace_memory:
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(idx) for idx in range(concurrency)))
+    wall_time = time.perf_counter() - start
+    cpu_time = time.process_time() - cpu_start
+
+    return {
+        "scenario": scenario,
+        "n_slides": number_of_slides,
+        "concurrency": concurrency,
+        "wall_time": wall_time,
+        "throughput": concurrency / wall_time,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "cpu_per_generation": cpu_time / concurrency,
+        "llm_calls": len(generator.llm.usage),
+        "peak_memory_kib": (tracemalloc.get_traced_memory()[1] - memory_before) / 1024 if args.trace_memory else None,
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    logger.setLevel(logging.WARNING)
+
+    from src import main as api
+
+    app = create_async_app(args.latency)
+    generator = api.slideGenerator
+    if not args.rate_limits:
+        without_rate_limits(generator)
+        api.admissionController.limiter = None
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        print(
+            f"latency={args.latency} search_latency={args.search_latency} output_token_latency={args.output_token_latency}s "
+            f"seed={args.seed} rate_limits={args.rate_limits}"
+        )
+        print(
+            f"{'scenario':>28} {'n_slides':>8} {'conc':>4} {'gen/s':>7} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} "
+            f"{'cpu/gen (ms)':>12} {'peak mem (KiB)':>14}"
+        )
+        for scenario in args.scenarios:
+            for number_of_slides in args.n_slides:
+                for concurrency in args.concurrency:
+                    result = await run_batch(generator, client, scenario, number_of_slides, concurrency, args)
+                    results.append(result)
+
+                    peak_memory = f"{result['peak_memory_kib']:>14.0f}" if result["peak_memory_kib"] is not None else f"{'-':>14}"
+                    print(
+                        f"{scenario:>28} {number_of_slides:>8} {concurrency:>4} {result['throughput']:>7.2f} {result['p50']:>8.3f} "
+                        f"{result['p95']:>8.3f} {result['p99']:>8.3f} {result['cpu_per_generation'] * 1000:>12.1f} {peak_memory}"
+                    )
+
+    # ru_maxrss is in KiB on Linux.
+    max_rss_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"max RSS: {max_rss_kib / 1024:.1f} MiB")
+
+    if args.output:
+        report = {
+            **git_revision(),
+            "measured_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "parameters": {
+                "latency": str(args.latency),
+                "search_latency": str(args.search_latency),
+                "output_token_latency": args.output_token_latency,
+                "seed": args.seed,
+                "rate_limits": args.rate_limits,
+            },
+            "max_rss_kib": max_rss_kib,
+            "results": results,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", choices=SCENARIOS, nargs="+", default=SCENARIOS)
+    parser.add_argument("--n-slides", type=int, nargs="+", default=[1, 5, 15, 30])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--latency", type=LatencyDistribution.parse, default=LatencyDistribution("lognormal", 0.2, 0.3), help="Latency of each stub LLM call (kind:mean[:spread])")
+    parser.add_argument("--search-latency", type=LatencyDistribution.parse, default=LatencyDistribution("lognormal", 0.3, 0.3), help="Latency of each stub search (kind:mean[:spread])")
+    parser.add_argument("--output-token-latency", type=float, default=0.0, help="Latency per generated token, in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the rate limits of agent_config.yaml")
+    parser.add_argument("--trace-memory", action="store_true", help="Measure the peak memory of each batch (slows the pipeline down)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,146 @@
+"""
+Startup benchmark of the API: how long a new worker takes to import `src.main`
+and to answer its first request, and how long until `/ready` reports the LLM
+and search clients created. Every run is a new Python process, as in a worker
+boot or an autoscaling cold start.
+
+- `import`: total import time of `src.main`, from `python -X importtime`.
+- `first response`: from the start of the process until a `GET /metrics`
+  served in process (ASGI) returns, including the app startup.
+- `ready`: from the start of the process until `GET /ready` returns 200 (on
+  commits without `/ready`, when the first response is served).
+
+It also lists the modules with the largest cumulative import time, and which of
+the LLM and search libraries were imported by `src.main` itself. No API key or
+network access is needed: the clients are created with placeholder keys and
+never called.
+
+Run from the `backend` folder:
+
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --runs 10 --output startup.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+
+from benchmarks.pipeline_benchmark import git_revision
+
+BACKEND_FOLDER = Path(__file__).resolve().parent.parent
+
+# A worker that is not ready by then (e.g. a missing API key) fails the run.
+COLD_START_TIMEOUT = 120
+
+HEAVY_MODULES = ["langchain_core", "langchain_google_genai", "google.genai", "tavily"]
+
+# Runs in the measured process: prints the timings, relative to `start`, as JSON.
+COLD_START_SCRIPT = """
+import asyncio, json, logging, sys, time
+start = float(sys.argv[1])
+
+import httpx
+from src.logger import logger
+logger.setLevel(logging.WARNING)
+
+from src.main import app
+imported = time.time() - start
+heavy_modules = [module for module in {heavy_modules!r} if module in sys.modules]
+
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        (await client.get("/metrics")).raise_for_status()
+        first_response = time.time() - start
+        # Before /ready (404) the clients were created while importing src.main.
+        while (await client.get("/ready")).status_code == 503:
+            await asyncio.sleep(0.01)
+        ready = time.time() - start
+    print(json.dumps({{"imported": imported, "first_response": first_response, "ready": ready, "heavy_modules": heavy_modules}}))
+
+asyncio.run(main())
+"""
+
+def benchmark_env() -> dict:
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_FOLDER)}
+    env.setdefault("GOOGLE_API_KEY", "benchmark")
+    env.setdefault("TAVILY_API_KEY", "benchmark")
+    return env
+
+def import_times(module: str) -> dict[str, float]:
+    """
+    Cumulative import time, in seconds, of every module imported by `module`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_FOLDER, env=benchmark_env(), capture_output=True, text=True, check=True
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative) / 1_000_000
+
+    return times
+
+def cold_start() -> dict:
+    script = COLD_START_SCRIPT.format(heavy_modules=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", script, str(time.time())],
+        cwd=BACKEND_FOLDER, env=benchmark_env(), capture_output=True, text=True, check=True, timeout=COLD_START_TIMEOUT
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+def main(args: argparse.Namespace) -> None:
+    runs = []
+    for _ in range(args.runs):
+        times = import_times("src.main")
+        runs.append({"import": times["src.main"], **cold_start(), "import_times": times})
+
+    import_time = statistics.median(run["import"] for run in runs)
+    first_response = statistics.median(run["first_response"] for run in runs)
+    ready = statistics.median(run["ready"] for run in runs)
+    heavy_modules = runs[-1]["heavy_modules"]
+
+    print(f"runs={args.runs} python={platform.python_version()}")
+    print(f"{'import (s)':>12} {'first response (s)':>18} {'ready (s)':>10}")
+    print(f"{import_time:>12.3f} {first_response:>18.3f} {ready:>10.3f}")
+    print(f"LLM and search libraries imported by src.main: {', '.join(heavy_modules) or 'none'}")
+
+    slowest = sorted(runs[-1]["import_times"].items(), key=lambda item: item[1], reverse=True)[:args.top]
+    print("\nSlowest imports (cumulative, last run):")
+    for name, seconds in slowest:
+        print(f"{seconds * 1000:>10.1f} ms  {name}")
+
+    if args.output:
+        report = {
+            **git_revision(),
+            "measured_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "runs": args.runs,
+            "import": import_time,
+            "first_response": first_response,
+            "ready": ready,
+            "heavy_modules": heavy_modules,
+            "slowest_imports": dict(slowest),
+            "results": [{key: value for key, value in run.items() if key != "import_times"} for run in runs],
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Number of new processes measured (the median is reported)")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports listed")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    main(parser.parse_args())
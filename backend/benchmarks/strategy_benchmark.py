@@ -0,0 +1,80 @@
+"""
+Compares the generation strategies (`per_slide` and `one_shot`) in number of LLM
+calls, token usage and latency, from the lesson plan to the filled presentation.
+`--template-fill-batch-size` restructures several slides per template fill call.
+
+The stub model takes `--latency` seconds per call plus `--output-token-latency`
+seconds per generated token, and `--invalid-ratio` of the one shot slides fail
+validation so that the per slide fallback is exercised.
+
+Run from the `backend` folder:
+
+    python -m benchmarks.strategy_benchmark --n-slides 5 10 20 30
+    python -m benchmarks.strategy_benchmark --n-slides 30 --template-fill-batch-size 5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+os.environ.setdefault("TAVILY_API_KEY", "stub")
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+
+from models.types import GenerationStrategyEnum
+
+from src.logger import logger
+
+from generator.async_generator import AsyncSlideGenerator
+
+from benchmarks.stubs import StubChatModel, StubAsyncTavilyClient
+
+LESSON_PLAN = "\n".join(f"{idx}. Tópico {idx} da aula\n   - Subtópico A\n   - Subtópico B" for idx in range(1, 16))
+
+async def run_strategy(generator: AsyncSlideGenerator, strategy: GenerationStrategyEnum, number_of_slides: int, args: argparse.Namespace) -> dict:
+    generator.llm = StubChatModel(args.latency, args.output_token_latency, args.invalid_ratio)
+
+    start = time.perf_counter()
+    presentation = await generator.generate_presentation(LESSON_PLAN, "Revolução Francesa", number_of_slides, strategy)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "calls": len(generator.llm.usage),
+        "input_tokens": sum(usage["input_tokens"] for usage in generator.llm.usage),
+        "output_tokens": sum(usage["output_tokens"] for usage in generator.llm.usage),
+        "latency": elapsed,
+        "content_slides": len(presentation) - 3,
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    logger.setLevel(logging.WARNING)
+
+    generator = AsyncSlideGenerator(llm=StubChatModel(), tavily_client=StubAsyncTavilyClient())
+    generator.max_concurrent_template_fills = args.max_concurrent_template_fills
+    generator.template_fill_cache = None
+    generator.template_fill_batch_size = args.template_fill_batch_size
+
+    print(
+        f"latency={args.latency}s output_token_latency={args.output_token_latency}s "
+        f"invalid_ratio={args.invalid_ratio} max_concurrent_template_fills={args.max_concurrent_template_fills} "
+        f"template_fill_batch_size={args.template_fill_batch_size}"
+    )
+    print(f"{'n_slides':>8} {'strategy':>9} {'calls':>5} {'input tok':>9} {'output tok':>10} {'latency (s)':>11} {'slides':>6}")
+    for number_of_slides in args.n_slides:
+        for strategy in GenerationStrategyEnum:
+            result = await run_strategy(generator, strategy, number_of_slides, args)
+            print(
+                f"{number_of_slides:>8} {strategy.value:>9} {result['calls']:>5} {result['input_tokens']:>9} "
+                f"{result['output_tokens']:>10} {result['latency']:>11.2f} {result['content_slides']:>6}"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-slides", type=int, nargs="+", default=[5, 10, 20, 30])
+    parser.add_argument("--latency", type=float, default=0.8, help="Fixed latency of each stub LLM call, in seconds")
+    parser.add_argument("--output-token-latency", type=float, default=0.004, help="Latency per generated token, in seconds")
+    parser.add_argument("--invalid-ratio", type=float, default=0.1, help="Share of one shot slides that fail validation")
+    parser.add_argument("--max-concurrent-template-fills", type=int, default=8)
+    parser.add_argument("--template-fill-batch-size", type=int, default=1)
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,69 @@
+"""
+Application factory that serves the API with the stub LLM and search clients.
+
+    BENCH_MODE=async|sync BENCH_LLM_LATENCY=0.5 uvicorn benchmarks.stub_app:create_app --factory
+
+`async` serves `src.main.app` itself; `sync` serves the previous blocking
+handlers (plain `def` endpoints over `SlideGenerator`) for comparison.
+"""
+import logging
+import os
+
+os.environ.setdefault("TAVILY_API_KEY", "stub")
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from models.types import SlideRequest, Slide
+
+from src.logger import logger
+
+from benchmarks.stubs import StubChatModel, StubTavilyClient, StubAsyncTavilyClient
+
+def create_sync_app(latency: float) -> FastAPI:
+    from generator.generator import SlideGenerator
+
+    slideGenerator = SlideGenerator(llm=StubChatModel(latency), tavily_client=StubTavilyClient(latency))
+    slideGenerator.lesson_plan_cache = None
+    slideGenerator.web_search_cache = None
+    slideGenerator.template_fill_cache = None
+    app = FastAPI(title="Slide Generator API (sync stub)")
+
+    @app.post("/slide", response_model=list[Slide])
+    def generate_slides(request: SlideRequest):
+        lesson_plan = slideGenerator.generate_lesson_plan(request.topic, request.grade, request.context)
+        return slideGenerator.generate_presentation(lesson_plan, request.topic, request.n_slides)
+
+    @app.post("/streaming")
+    def streaming_slides(request: SlideRequest) -> StreamingResponse:
+        lesson_plan = slideGenerator.generate_lesson_plan(request.topic, request.grade, request.context)
+        return StreamingResponse(
+            slideGenerator.generate_presentation_stream(lesson_plan, request.topic, request.n_slides),
+            media_type="text/plain"
+        )
+
+    return app
+
+def create_async_app(latency: float) -> FastAPI:
+    from generator.async_generator import AsyncSlideGenerator
+    from src import main
+
+    main.slideGenerator = AsyncSlideGenerator(llm=StubChatModel(latency), tavily_client=StubAsyncTavilyClient(latency))
+    # Every benchmark request repeats the same topic, caches would turn it into a lookup benchmark.
+    main.slideGenerator.lesson_plan_cache = None
+    main.slideGenerator.web_search_cache = None
+    main.slideGenerator.template_fill_cache = None
+    main.jobManager.generator = main.slideGenerator
+    main.generationCoalescer.generator = main.slideGenerator
+    main.admissionController.limiter = main.slideGenerator.rate_limiters.get(main.admission_config["provider"])
+    return main.app
+
+def create_app() -> FastAPI:
+    logger.setLevel(logging.WARNING)
+
+    latency = float(os.getenv("BENCH_LLM_LATENCY", "0.5"))
+    if os.getenv("BENCH_MODE", "async") == "sync":
+        return create_sync_app(latency)
+
+    return create_async_app(latency)
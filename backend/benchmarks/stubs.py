@@ -0,0 +1,363 @@
+"""
+Local stand-ins for the Gemini chat model and the Tavily client, used to
+benchmark the generation pipeline without network access or API keys.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import time
+
+from types import UnionType
+from typing import Any, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from models.types import PresentationContent, SlideContentInput
+from models.templates import TEMPLATE_MODELS
+
+from generator.web_content import get_token_counter
+
+class LatencyDistribution:
+    """
+    Latency of a stub call, in seconds, drawn from `kind`:
+
+    - `constant`: always `mean`.
+    - `uniform`: between `mean - spread` and `mean + spread`.
+    - `lognormal`: median `mean` and shape `spread` (sigma), the long tail of real API calls.
+    - `exponential`: average `mean`.
+
+    Written as `kind:mean[:spread]` on the command line (see `parse`).
+    """
+
+    KINDS = ("constant", "uniform", "lognormal", "exponential")
+
+    def __init__(self, kind: str = "constant", mean: float = 0.5, spread: float = 0.0):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution {kind!r}, expected one of {', '.join(self.KINDS)}.")
+
+        self.kind = kind
+        self.mean = mean
+        self.spread = spread
+
+    @classmethod
+    def parse(cls, text: str) -> "LatencyDistribution":
+        kind, _, parameters = text.partition(":")
+        if not parameters:
+            # A bare number is a constant latency.
+            return cls("constant", float(kind))
+
+        return cls(kind, *(float(value) for value in parameters.split(":")))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.kind == "uniform":
+            return max(0.0, rng.uniform(self.mean - self.spread, self.mean + self.spread))
+        if self.kind == "lognormal":
+            return self.mean * math.exp(rng.gauss(0, self.spread))
+        if self.kind == "exponential":
+            return rng.expovariate(1 / self.mean)
+
+        return self.mean
+
+    def __str__(self) -> str:
+        if self.kind == "constant":
+            return f"{self.mean:g}s"
+        return f"{self.kind}:{self.mean:g}:{self.spread:g}"
+
+def as_latency(latency: float | LatencyDistribution) -> LatencyDistribution:
+    return latency if isinstance(latency, LatencyDistribution) else LatencyDistribution("constant", latency)
+
+NUMBER_OF_SLIDES_PATTERN = re.compile(r"Número de Slides[^:\n]*:\s*(\d+)")
+REQUESTED_TEMPLATE_PATTERN = re.compile(r"templateID:\s*(\d+)")
+
+def sample_value(annotation: Any, label: str = "Texto") -> Any:
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+
+    if origin in (Union, UnionType):
+        return sample_value(next(arg for arg in args if arg is not type(None)), label)
+    if origin is list:
+        return [sample_value(args[0], f"{label} {idx + 1}") for idx in range(2)]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {
+            name: sample_value(field.annotation, name)
+            for name, field in annotation.model_fields.items()
+        }
+    if annotation is int:
+        return 1
+
+    return f"{label} de exemplo"
+
+def sample_model(model: type[BaseModel]) -> BaseModel:
+    """
+    Builds a valid instance of `model` by filling every field with placeholder values.
+    """
+    return model.model_validate(sample_value(model))
+
+def sample_presentation_content(number_of_slides: int) -> PresentationContent:
+    template_ids = [template_id for template_id in TEMPLATE_MODELS if template_id not in (1, 29)]
+
+    return PresentationContent(slides=[
+        SlideContentInput(
+            templateID=template_ids[idx % len(template_ids)],
+            slideContent={"title": f"Slide {idx + 1}", "content": "Conteúdo de exemplo"}
+        )
+        for idx in range(number_of_slides)
+    ])
+
+def sample_json_schema(schema: dict, definitions: dict, label: str = "Texto") -> Any:
+    if "$ref" in schema:
+        return sample_json_schema(definitions[schema["$ref"].split("/")[-1]], definitions, label)
+    if "anyOf" in schema:
+        return sample_json_schema(next(option for option in schema["anyOf"] if option.get("type") != "null"), definitions, label)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {
+            name: sample_json_schema(property_schema, definitions, name)
+            for name, property_schema in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        size = max(schema.get("minItems", 0), min(2, schema.get("maxItems", 2)))
+        return [sample_json_schema(schema["items"], definitions, f"{label} {idx + 1}") for idx in range(size)]
+    if schema_type in ("integer", "number"):
+        return 1
+    if schema_type == "boolean":
+        return True
+
+    return f"{label} de exemplo"
+
+def _variant_template_ids(variant: dict, definitions: dict) -> list[int]:
+    if "$ref" in variant:
+        variant = definitions[variant["$ref"].split("/")[-1]]
+
+    template_id_schema = variant["properties"]["templateID"]
+    return template_id_schema.get("enum") or [template_id_schema.get("const")]
+
+def sample_structured_slides(schema: dict, number_of_slides: int, invalid_ratio: float, requested_template_ids: list[int] | None = None) -> dict:
+    """
+    Samples `{"slides": [...]}` for a slides schema (see `generator.structured_output`).
+    Slides follow `requested_template_ids` when given (batch fills), otherwise they
+    cycle through the template variants. A share of `invalid_ratio` slides gets an
+    empty content so that it fails local validation.
+    """
+    definitions = schema.get("$defs", {})
+    items = schema["properties"]["slides"]["items"]
+    # Content slides are assembled by title, so templates without one (the optional question) are left out.
+    variants = [
+        variant for variant in items.get("anyOf", [items])
+        if "title" in sample_json_schema(variant, definitions)["slideContent"]
+    ] or items.get("anyOf", [items])
+
+    slides = []
+    for idx in range(number_of_slides):
+        if requested_template_ids:
+            template_id = requested_template_ids[idx % len(requested_template_ids)]
+            variant = next(
+                (variant for variant in variants if template_id in _variant_template_ids(variant, definitions)),
+                variants[0]
+            )
+            slide = sample_json_schema(variant, definitions, f"Slide {idx + 1}")
+            if template_id in _variant_template_ids(variant, definitions):
+                slide["templateID"] = template_id
+        else:
+            slide = sample_json_schema(variants[idx % len(variants)], definitions, f"Slide {idx + 1}")
+
+        if int((idx + 1) * invalid_ratio) > int(idx * invalid_ratio):
+            slide["slideContent"] = {}
+
+        slides.append(slide)
+
+    return {"slides": slides}
+
+def _number_of_slides(messages: list) -> int:
+    for message in messages:
+        match = NUMBER_OF_SLIDES_PATTERN.search(str(message.content))
+        if match:
+            return int(match.group(1))
+
+    return 1
+
+def _text_of(value: Any) -> str:
+    if isinstance(value, BaseModel):
+        return value.model_dump_json()
+    if isinstance(value, AIMessage):
+        return str(value.content)
+
+    return json.dumps(value, ensure_ascii=False)
+
+class StubStructuredModel:
+    def __init__(self, chat_model: "StubChatModel", schema: type[BaseModel] | dict, include_raw: bool = False):
+        self.chat_model = chat_model
+        self.schema = schema
+        self.include_raw = include_raw
+
+    def _response(self, messages: list) -> BaseModel | dict:
+        if isinstance(self.schema, dict):
+            requested_template_ids = [int(template_id) for template_id in REQUESTED_TEMPLATE_PATTERN.findall(str(messages[-1].content))]
+            return sample_structured_slides(self.schema, _number_of_slides(messages), self.chat_model.invalid_ratio, requested_template_ids)
+        if self.schema is PresentationContent:
+            return sample_presentation_content(_number_of_slides(messages))
+
+        return sample_model(self.schema)
+
+    def _result(self, response: BaseModel | dict, usage: dict[str, int]) -> BaseModel | dict:
+        if not self.include_raw:
+            return response
+
+        raw = AIMessage(content=_text_of(response), usage_metadata=usage)
+        return {"raw": raw, "parsed": response, "parsing_error": None}
+
+    def invoke(self, messages: list, *args, **kwargs) -> BaseModel | dict:
+        response = self._response(messages)
+        delay, usage = self.chat_model.record_call(messages, response)
+        time.sleep(delay)
+        self.chat_model.maybe_fail()
+        return self._result(response, usage)
+
+    async def ainvoke(self, messages: list, *args, **kwargs) -> BaseModel | dict:
+        response = self._response(messages)
+        delay, usage = self.chat_model.record_call(messages, response)
+        await asyncio.sleep(delay)
+        self.chat_model.maybe_fail()
+        return self._result(response, usage)
+
+class StubJsonModel:
+    """
+    Stands for the chat model bound to a JSON response schema
+    (`response_mime_type="application/json"`). `astream` sends the sample
+    JSON in chunks of `STREAM_CHUNK_CHARS` characters: the first one after
+    `latency` seconds, the next ones `output_token_latency` seconds per token
+    apart. The last chunk carries the usage metadata.
+    """
+
+    STREAM_CHUNK_CHARS = 16
+
+    def __init__(self, chat_model: "StubChatModel", response_json_schema: dict):
+        self.chat_model = chat_model
+        self.schema = response_json_schema
+
+    async def astream(self, messages: list, *args, **kwargs):
+        response = sample_json_schema(self.schema, self.schema.get("$defs", {}))
+        text = json.dumps(response, ensure_ascii=False)
+        delay, usage = self.chat_model.record_call(messages, response)
+
+        chunks = [text[start:start + self.STREAM_CHUNK_CHARS] for start in range(0, len(text), self.STREAM_CHUNK_CHARS)]
+        first_chunk_delay = delay - usage["output_tokens"] * self.chat_model.output_token_latency
+        for idx, chunk in enumerate(chunks):
+            await asyncio.sleep(first_chunk_delay if idx == 0 else (delay - first_chunk_delay) / max(1, len(chunks) - 1))
+            yield AIMessageChunk(content=chunk, usage_metadata=usage if idx == len(chunks) - 1 else None)
+
+        self.chat_model.maybe_fail()
+
+class StubTransientError(Exception):
+    """
+    Stands for a 503 response of the Gemini API.
+    """
+    code = 503
+
+class StubChatModel:
+    """
+    Mimics the subset of `ChatGoogleGenerativeAI` used by the generators.
+    Every call returns schema-valid placeholder content after `latency` seconds
+    (a number or a `LatencyDistribution`) plus `output_token_latency` seconds per
+    generated token. Token usage of every call is recorded in `usage`; with a
+    `seed`, the latencies, slow calls and failures are the same on every run.
+
+    A `slow_call_ratio` share of the calls takes `slow_call_factor` times longer,
+    and an `error_ratio` share fails with `StubTransientError` after its latency.
+    """
+
+    def __init__(
+        self,
+        latency: float | LatencyDistribution = 0.5,
+        output_token_latency: float = 0.0,
+        invalid_ratio: float = 0.0,
+        slow_call_ratio: float = 0.0,
+        slow_call_factor: float = 1.0,
+        error_ratio: float = 0.0,
+        seed: int | None = None
+    ):
+        self.latency = as_latency(latency)
+        self.output_token_latency = output_token_latency
+        self.invalid_ratio = invalid_ratio
+        self.slow_call_ratio = slow_call_ratio
+        self.slow_call_factor = slow_call_factor
+        self.error_ratio = error_ratio
+        self.random = random.Random(seed)
+        self.usage: list[dict[str, int]] = []
+        self.count_tokens = get_token_counter("cl100k_base")
+
+    def record_call(self, messages: list, response: Any) -> tuple[float, dict[str, int]]:
+        """
+        Records the token usage of a call and returns how long it should take,
+        along with its `usage_metadata`.
+        """
+        input_tokens = sum(self.count_tokens.count(str(message.content)) for message in messages)
+        output_tokens = self.count_tokens.count(_text_of(response))
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+        self.usage.append(usage)
+
+        delay = self.latency.sample(self.random) + output_tokens * self.output_token_latency
+        if self.random.random() < self.slow_call_ratio:
+            delay *= self.slow_call_factor
+
+        return delay, usage
+
+    def maybe_fail(self) -> None:
+        if self.random.random() < self.error_ratio:
+            raise StubTransientError("503 Service Unavailable (stub)")
+
+    def invoke(self, messages: list, *args, **kwargs) -> AIMessage:
+        response = AIMessage(content="Plano de aula de exemplo")
+        delay, response.usage_metadata = self.record_call(messages, response)
+        time.sleep(delay)
+        self.maybe_fail()
+        return response
+
+    async def ainvoke(self, messages: list, *args, **kwargs) -> AIMessage:
+        response = AIMessage(content="Plano de aula de exemplo")
+        delay, response.usage_metadata = self.record_call(messages, response)
+        await asyncio.sleep(delay)
+        self.maybe_fail()
+        return response
+
+    def with_structured_output(self, schema: type[BaseModel] | dict, include_raw: bool = False, **kwargs) -> StubStructuredModel:
+        return StubStructuredModel(self, schema, include_raw)
+
+    def bind(self, response_json_schema: dict, **kwargs) -> StubJsonModel:
+        return StubJsonModel(self, response_json_schema)
+
+SEARCH_RESPONSE = {
+    "query": "",
+    "results": [
+        {"url": "https://example.com", "title": "Exemplo", "content": "Conteúdo de exemplo", "score": 0.9}
+    ]
+}
+
+class StubTavilyClient:
+    def __init__(self, latency: float | LatencyDistribution = 0.5, seed: int | None = None):
+        self.latency = as_latency(latency)
+        self.random = random.Random(seed)
+
+    def search(self, query: str, **kwargs) -> dict:
+        time.sleep(self.latency.sample(self.random))
+        return {**SEARCH_RESPONSE, "query": query}
+
+class StubAsyncTavilyClient:
+    def __init__(self, latency: float | LatencyDistribution = 0.5, seed: int | None = None):
+        self.latency = as_latency(latency)
+        self.random = random.Random(seed)
+
+    async def search(self, query: str, **kwargs) -> dict:
+        await asyncio.sleep(self.latency.sample(self.random))
+        return {**SEARCH_RESPONSE, "query": query}
@@ -0,0 +1,464 @@
+import asyncio
+
+from contextlib import aclosing, asynccontextmanager
+from typing import TYPE_CHECKING, Callable, Coroutine
+
+from pydantic import BaseModel
+
+from models.types import Slide, SlideTypeEnum, PresentationContent, StreamOrderEnum, GenerationStrategyEnum, DeckArtifacts
+
+from src.logger import logger
+
+from generator.config import get_tavily_api_key
+from generator.generator import BaseSlideGenerator
+from generator.singleflight import AsyncSingleFlight
+from generator.rate_limit import estimate_message_tokens
+from generator.partial_output import parse_partial_object, complete_partial_template
+from generator.scheduler import scheduled_call, shared_call
+from generator.metrics import timed_stage, record_token_usage, track_single_flight, CANCELLED_CALLS
+from generator.structured_output import template_json_schema
+from generator.utils import (
+    get_agenda_slide,
+    build_static_slide,
+    CONCLUSION_SLIDE,
+    streaming_new_slide_event
+)
+
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from tavily import AsyncTavilyClient
+
+class AsyncSlideGenerator(BaseSlideGenerator):
+    """
+    Asynchronous counterpart of `SlideGenerator`. Every LLM and search call is
+    awaited (`ainvoke` and `AsyncTavilyClient`), so a single event loop can keep
+    many generations in flight without holding one worker thread per request.
+    """
+
+    def __init__(self, llm: "ChatGoogleGenerativeAI | None" = None, tavily_client: "AsyncTavilyClient | None" = None):
+        logger.info("Initializing AsyncSlideGenerator...")
+        super().__init__(llm)
+
+        self._tavily_client = tavily_client
+        self.web_search_flight = AsyncSingleFlight()
+        track_single_flight("web_search", self.web_search_flight)
+        logger.info("AsyncSlideGenerator initialized!")
+
+    def _create_tavily_client(self) -> "AsyncTavilyClient":
+        from tavily import AsyncTavilyClient
+
+        return AsyncTavilyClient(get_tavily_api_key())
+
+    async def _invoke_llm(self, stage: str, messages: list, schema=None):
+        llm = self._stage_llm(stage)
+
+        try:
+            return await self._invoke_model(stage, llm, messages, schema)
+        except Exception as e:
+            if (escalation_stage := self._escalation_stage(stage, e)) is None:
+                raise
+
+            return await self._invoke_model(escalation_stage, self._stage_llm(escalation_stage), messages, schema)
+
+    async def _invoke_model(self, stage: str, llm: "ChatGoogleGenerativeAI", messages: list, schema=None):
+        call_policy = self.call_policies.get(stage)
+        tokens = estimate_message_tokens(messages)
+
+        async with scheduled_call():
+            with timed_stage(stage):
+                if schema is None:
+                    response = await call_policy.acall(lambda: llm.ainvoke(messages), tokens)
+                    record_token_usage(stage, response)
+                    return response
+
+                structured_llm = llm.with_structured_output(schema, include_raw=True)
+                result = await call_policy.acall(lambda: structured_llm.ainvoke(messages), tokens)
+                return self._parse_structured_result(stage, result)
+
+    async def _stream_llm(self, stage: str, messages: list, schema: type[BaseModel], on_partial: Callable[[dict], None]) -> BaseModel:
+        """
+        Streams a structured LLM call in JSON mode, calling `on_partial` with
+        the object parsed so far each time it grows. Returns the complete
+        output validated against `schema`.
+        """
+        llm = self._stage_llm(stage)
+
+        try:
+            return await self._stream_model(stage, llm, messages, schema, on_partial)
+        except Exception as e:
+            if (escalation_stage := self._escalation_stage(stage, e)) is None:
+                raise
+
+            return await self._stream_model(escalation_stage, self._stage_llm(escalation_stage), messages, schema, on_partial)
+
+    async def _stream_model(self, stage: str, llm: "ChatGoogleGenerativeAI", messages: list, schema: type[BaseModel], on_partial: Callable[[dict], None]) -> BaseModel:
+        call_policy = self.call_policies.get(stage)
+        tokens = estimate_message_tokens(messages)
+        json_llm = llm.bind(response_mime_type="application/json", response_json_schema=template_json_schema(schema))
+
+        async def stream():
+            message = None
+            parsed = None
+            async for chunk in json_llm.astream(messages):
+                message = chunk if message is None else message + chunk
+                partial = parse_partial_object(message.text)
+                if partial is not None and partial != parsed:
+                    parsed = partial
+                    on_partial(partial)
+            return message
+
+        async with scheduled_call():
+            with timed_stage(stage):
+                message = await call_policy.acall(stream, tokens)
+                record_token_usage(stage, message)
+
+        return schema.model_validate_json(message.text)
+
+    async def search_web_content(self, class_topic: str, class_grade: str) -> dict:
+        query = self._lesson_plan_search_query(class_topic, class_grade)
+        cache_key = self._web_search_cache_key(query)
+
+        if (auxiliary_web_content := self._cached_web_search(cache_key)) is not None:
+            logger.info("Web search results found in cache.")
+            return auxiliary_web_content
+
+        async def search() -> dict:
+            async with scheduled_call():
+                if self.web_search_rate_limiter is not None:
+                    await self.web_search_rate_limiter.aacquire()
+
+                with timed_stage("web_search"):
+                    auxiliary_web_content = await self.tavilyClient.search(query=query, search_depth="advanced")
+            self._store_web_search(cache_key, auxiliary_web_content)
+            return auxiliary_web_content
+
+        # Generations of the same batch share their searches even when the cache is disabled.
+        return await shared_call(("web_search", cache_key), lambda: self.web_search_flight.do(cache_key, search))
+
+    async def generate_lesson_plan(self, class_topic: str, class_grade: str, class_additional_instructions: str, artifacts: DeckArtifacts | None = None) -> str:
+        cache_key = self._lesson_plan_cache_key(class_topic, class_grade, class_additional_instructions)
+        # The lesson plan cache is usually on disk (SQLite), so it is read and written in a thread.
+        if self.lesson_plan_cache and (lesson_plan := await asyncio.to_thread(self.lesson_plan_cache.get, cache_key)) is not None:
+            logger.info("Lesson plan found in cache.")
+            if artifacts is not None:
+                artifacts.lesson_plan = lesson_plan
+            return lesson_plan
+
+        logger.info("Generating lesson plan...")
+        auxiliary_web_content = await self.search_web_content(class_topic, class_grade)
+
+        messages = self._lesson_plan_messages(class_topic, class_grade, class_additional_instructions, auxiliary_web_content)
+
+        response = await self._invoke_llm("lesson_plan", messages)
+
+        if self.lesson_plan_cache:
+            await asyncio.to_thread(self.lesson_plan_cache.set, cache_key, response.content)
+
+        if artifacts is not None:
+            artifacts.web_search = auxiliary_web_content
+            artifacts.lesson_plan = response.content
+
+        return response.content
+
+    async def generate_presentation_content(self, lesson_plan: str, class_topic: str, templates_description: str, number_of_slides: int) -> list:
+        logger.info("Generating the presentation content...")
+        messages = self._presentation_content_messages(lesson_plan, class_topic, templates_description, number_of_slides)
+
+        response = await self._invoke_llm("presentation_content", messages, PresentationContent)
+
+        return [slide.model_dump() for slide in response.slides]
+
+    async def generate_structured_presentation_content(self, lesson_plan: str, class_topic: str, templates_description: str, number_of_slides: int) -> list:
+        logger.info("Generating the structured presentation content...")
+        messages = self._structured_presentation_messages(lesson_plan, class_topic, templates_description, number_of_slides)
+
+        response = await self._invoke_llm("structured_presentation", messages, self._structured_slides_schema())
+
+        return [slide for slide in (response or {}).get("slides") or [] if isinstance(slide, dict)]
+
+    async def _plan_presentation(self, lesson_plan: str, class_topic: str, number_of_slides: int, generation_strategy: GenerationStrategyEnum | None) -> tuple[list[dict], list[dict | None]]:
+        templates_description = self.templates_registry.descriptions
+
+        if (generation_strategy or self.generation_strategy) == GenerationStrategyEnum.ONE_SHOT:
+            slides_content = await self.generate_structured_presentation_content(lesson_plan, class_topic, templates_description, number_of_slides)
+            return slides_content, self._prefill_structured_slides(slides_content)
+
+        slides_content = await self.generate_presentation_content(lesson_plan, class_topic, templates_description, number_of_slides)
+        return slides_content, [None] * len(slides_content)
+
+    async def _start_template_fills(self, slides_content: list[dict], class_topic: str, prefilled: list[dict | None], on_slide_patch: Callable[[int, dict], None] | None = None) -> list[asyncio.Future]:
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrent_template_fills))
+        # The template fill cache may have a disk level (SQLite): it is read in a thread.
+        prefilled = await asyncio.to_thread(self._prefill_cached_template_fills, slides_content, class_topic, prefilled)
+
+        # The stage of the call each task will send, until it is sent. A task
+        # cancelled before that, whether it never ran or was still queued for
+        # a slot, saved its call (once sent, `timed_stage` counts it as wasted).
+        unsent_calls: dict[asyncio.Task, str] = {}
+
+        def count_saved_call(task: asyncio.Task) -> None:
+            stage = unsent_calls.pop(task, None)
+            if stage is not None and task.cancelled():
+                CANCELLED_CALLS.inc(stage=stage, outcome="saved")
+
+        def start_fill(coroutine: Coroutine, stage: str | None) -> asyncio.Task:
+            task = asyncio.create_task(coroutine)
+            if stage is not None:
+                unsent_calls[task] = stage
+            task.add_done_callback(count_saved_call)
+            return task
+
+        def cancel_batch(task: asyncio.Task, batch_task: asyncio.Task) -> None:
+            # Also when the slide was cancelled before it awaited the batch.
+            if task.cancelled():
+                batch_task.cancel()
+
+        @asynccontextmanager
+        async def fill_slot(stage: str):
+            task = asyncio.current_task()
+            unsent_calls[task] = stage
+            await semaphore.acquire()
+            unsent_calls.pop(task, None)
+
+            try:
+                yield
+            finally:
+                semaphore.release()
+
+        async def fill(slide: dict, position: int) -> dict:
+            on_partial = None
+            if on_slide_patch is not None and self.stream_slide_patches:
+                on_partial = lambda partial: on_slide_patch(position, partial)
+
+            async with fill_slot("template_fill"):
+                return await self.generate_one_template_content(slide, class_topic, on_partial)
+
+        async def fill_batch(slides: list[dict]) -> list[dict | None]:
+            async with fill_slot("template_fill_batch"):
+                try:
+                    return await self.generate_batch_templates_content(slides, class_topic)
+                except Exception as e:
+                    logger.error(f"Error generating template content for a batch of {len(slides)} slides: {e}")
+                    return [None] * len(slides)
+
+        async def fill_from_batch(slide: dict, position: int, batch_task: asyncio.Task, index: int) -> dict:
+            filled_template = (await batch_task)[index]
+            if filled_template is not None:
+                return filled_template
+
+            return await fill(slide, position)
+
+        fill_tasks: list[asyncio.Future | None] = [None] * len(slides_content)
+
+        for batch in self._template_fill_batches(slides_content, prefilled):
+            batch_task = start_fill(fill_batch([slides_content[position] for position in batch]), "template_fill_batch")
+
+            for index, position in enumerate(batch):
+                # Its own call is only needed if the batch leaves the slide unfilled.
+                fill_tasks[position] = start_fill(fill_from_batch(slides_content[position], position, batch_task, index), None)
+                fill_tasks[position].add_done_callback(lambda task, batch_task=batch_task: cancel_batch(task, batch_task))
+
+        for position, (slide, filled_template) in enumerate(zip(slides_content, prefilled)):
+            if fill_tasks[position] is not None:
+                continue
+
+            if filled_template is None:
+                fill_tasks[position] = start_fill(fill(slide, position), "template_fill")
+                continue
+
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(filled_template)
+            fill_tasks[position] = future
+
+        return fill_tasks
+
+    async def _collect_template_fills(self, fill_tasks: list[asyncio.Future], slides_content: list[dict]) -> list[dict]:
+        results = await asyncio.gather(*fill_tasks, return_exceptions=True)
+
+        filled_templates = []
+        for slide, result in zip(slides_content, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error generating template content for slide {slide.get('templateID')}: {result}")
+                continue
+
+            filled_templates.append(result)
+
+        return filled_templates
+
+    async def _completed_template_fills(self, fill_tasks: list[asyncio.Future], slides_content: list[dict], stream_order: StreamOrderEnum):
+        """
+        Yields `(position, filled_template)` pairs. In ordered mode a slide is only
+        yielded after all the previous ones; in completion mode each slide is
+        yielded as soon as its fill finishes. In both, failed fills are skipped.
+        """
+        if stream_order == StreamOrderEnum.ORDERED:
+            for position, task in enumerate(fill_tasks):
+                logger.info("Filling presentation template %s.", position + 1)
+                try:
+                    filled_template = await task
+                except Exception as e:
+                    logger.error(f"Error generating template content for slide {slides_content[position].get('templateID')}: {e}")
+                    continue
+
+                yield position, filled_template
+            return
+
+        pending = {task: position for position, task in enumerate(fill_tasks)}
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in sorted(done, key=pending.get):
+                position = pending.pop(task)
+
+                if task.exception() is not None:
+                    logger.error(f"Error generating template content for slide {slides_content[position].get('templateID')}: {task.exception()}")
+                    continue
+
+                yield position, task.result()
+
+    async def generate_templates_content(self, slides_content: list[dict], class_topic: str) -> list[dict]:
+        fill_tasks = await self._start_template_fills(slides_content, class_topic, [None] * len(slides_content))
+
+        return await self._collect_template_fills(fill_tasks, slides_content)
+
+    async def generate_one_template_content(self, slide_info: dict, class_topic: str, on_partial: Callable[[dict], None] | None = None) -> dict:
+        """
+        With `on_partial`, the fill is streamed and `on_partial` receives the
+        partially filled template (with empty values for the fields still
+        missing) as it is generated.
+        """
+        template_id, TargetModel, messages = self._template_fill_request(slide_info, class_topic)
+
+        if on_partial is None:
+            response = await self._invoke_llm("template_fill", messages, TargetModel)
+        else:
+            response = await self._stream_llm(
+                "template_fill_stream",
+                messages,
+                TargetModel,
+                lambda partial: on_partial({"templateID": template_id, "generationTemplate": complete_partial_template(TargetModel, partial)})
+            )
+
+        filled_template = {
+            "templateID": template_id,
+            "generationTemplate": response.model_dump()
+        }
+        await asyncio.to_thread(self._store_template_fill, slide_info, class_topic, filled_template)
+
+        return filled_template
+
+    async def generate_batch_templates_content(self, slides_info: list[dict], class_topic: str) -> list[dict | None]:
+        schema, messages = self._template_batch_fill_request(slides_info, class_topic)
+
+        response = await self._invoke_llm("template_fill_batch", messages, schema)
+
+        return self._demultiplex_template_batch(slides_info, response)
+
+    async def generate_presentation(self, lesson_plan: str, class_topic: str, number_of_slides: int, generation_strategy: GenerationStrategyEnum | None = None) -> list[Slide]:
+        slides_content, prefilled = await self._plan_presentation(lesson_plan, class_topic, number_of_slides, generation_strategy)
+
+        logger.info("Filling presentation templates...")
+
+        fill_tasks = await self._start_template_fills(slides_content, class_topic, prefilled)
+        filled_templates = await self._collect_template_fills(fill_tasks, slides_content)
+
+        return self._assemble_presentation(filled_templates, class_topic)
+
+    async def generate_presentation_slides(self, lesson_plan: str, class_topic: str, number_of_slides: int, stream_order: StreamOrderEnum = StreamOrderEnum.ORDERED, generation_strategy: GenerationStrategyEnum | None = None, include_introduction: bool = True, on_slide_patch: Callable[[int, dict], None] | None = None, artifacts: DeckArtifacts | None = None):
+        """
+        Yields `(slide, position)` pairs as the presentation is generated: the
+        introduction (unless it was already sent, see `introduction_slide`),
+        each content slide with its position among the content slides, then
+        the agenda and the conclusion (whose position is None).
+
+        When `streaming_config.slide_patches` is enabled, `on_slide_patch`
+        receives the position and the partially filled template of the content
+        slides still being filled. `artifacts` receives the planned slides and
+        their filled templates.
+        """
+        if include_introduction:
+            yield self.introduction_slide(class_topic), None
+
+        slides_content, prefilled = await self._plan_presentation(lesson_plan, class_topic, number_of_slides, generation_strategy)
+        if artifacts is not None:
+            artifacts.slides_content = slides_content
+            artifacts.filled_templates = [None] * len(slides_content)
+
+        fill_tasks = await self._start_template_fills(slides_content, class_topic, prefilled, on_slide_patch)
+
+        templates_titles: dict[int, str] = {}
+        try:
+            async for position, filled_template_dict in self._completed_template_fills(fill_tasks, slides_content, stream_order):
+                templates_titles[position] = filled_template_dict["generationTemplate"]["title"]
+                if artifacts is not None:
+                    artifacts.filled_templates[position] = filled_template_dict
+
+                logger.info("Streaming slide %s.", position + 1)
+                yield self._content_slide(filled_template_dict), position
+        finally:
+            for task in fill_tasks:
+                task.cancel()
+
+        agenda_topics = [templates_titles[position] for position in sorted(templates_titles)]
+        yield build_static_slide(SlideTypeEnum.AGENDA, get_agenda_slide(agenda_topics)), None
+        yield CONCLUSION_SLIDE, None
+
+        logger.info("Presentation generated!")
+
+    async def regenerate_slide(self, artifacts: DeckArtifacts, position: int, template_id: int | None = None) -> DeckArtifacts:
+        """
+        Fills the content slide at `position` again (with `template_id`, when
+        given), from its planned content: a single LLM call. The template fill
+        cache is not read, since the point is a different slide.
+        """
+        slide_content = dict(artifacts.slides_content[position])
+        if template_id is not None:
+            slide_content["templateID"] = template_id
+
+        filled_template = await self.generate_one_template_content(slide_content, artifacts.topic)
+
+        artifacts = artifacts.model_copy(deep=True)
+        artifacts.slides_content[position] = slide_content
+        artifacts.filled_templates[position] = filled_template
+        return artifacts
+
+    async def resize_presentation(self, artifacts: DeckArtifacts, number_of_slides: int) -> DeckArtifacts:
+        """
+        Plans `number_of_slides` content slides again from the stored lesson
+        plan and fills only the new slides: a planned slide with the template
+        and title of a slide of the deck keeps its fill (see
+        `_planned_slide_key`). The search and the lesson plan are reused.
+        """
+        slides_content, prefilled = await self._plan_presentation(artifacts.lesson_plan, artifacts.topic, number_of_slides, artifacts.generation_strategy)
+
+        # Each previous fill is reused at most once, in order, for slides that repeat a title.
+        previous_fills: dict[tuple, list[dict]] = {}
+        for slide, filled_template in zip(artifacts.slides_content, artifacts.filled_templates):
+            if filled_template is not None:
+                previous_fills.setdefault(self._planned_slide_key(slide), []).append(filled_template)
+
+        for position, planned in enumerate(slides_content):
+            if prefilled[position] is None and (fills := previous_fills.get(self._planned_slide_key(planned))):
+                prefilled[position] = fills.pop(0)
+
+        logger.info("Resizing deck to %s slides, %s fills reused.", len(slides_content), sum(filled is not None for filled in prefilled))
+
+        fill_tasks = await self._start_template_fills(slides_content, artifacts.topic, prefilled)
+        results = await asyncio.gather(*fill_tasks, return_exceptions=True)
+
+        filled_templates = []
+        for slide, result in zip(slides_content, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error generating template content for slide {slide.get('templateID')}: {result}")
+                result = None
+            filled_templates.append(result)
+
+        return artifacts.model_copy(update={"slides_content": slides_content, "filled_templates": filled_templates}, deep=True)
+
+    async def generate_presentation_stream(self, lesson_plan: str, class_topic: str, number_of_slides: int, stream_order: StreamOrderEnum = StreamOrderEnum.ORDERED, generation_strategy: GenerationStrategyEnum | None = None):
+        slides = self.generate_presentation_slides(lesson_plan, class_topic, number_of_slides, stream_order, generation_strategy)
+
+        # Closing the stream must also close the inner generator, which cancels the pending fills.
+        async with aclosing(slides):
+            async for slide, position in slides:
+                yield streaming_new_slide_event(slide, position=position)
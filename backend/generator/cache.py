@@ -0,0 +1,286 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import zstandard
+
+from src.logger import logger
+
+CACHE_BACKEND_MEMORY = "memory"
+CACHE_BACKEND_SQLITE = "sqlite"
+CACHE_BACKEND_NONE = "none"
+
+CACHE_COMPRESSION_ZSTD = "zstd"
+CACHE_COMPRESSION_NONE = "none"
+
+ZSTD_FRAME_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# SQLite caches purge expired and overflowing entries once every this share of `max_entries` writes.
+SQLITE_EVICTION_INTERVAL_RATIO = 0.01
+
+def normalize_text(value: str | None) -> str:
+    """
+    Normalizes free text typed by users so that trivially different inputs
+    ("Revolução Francesa " and "revolução  francesa") share the same cache key.
+    """
+    value = unicodedata.normalize("NFC", value or "")
+    return " ".join(value.casefold().split())
+
+def make_cache_key(*parts: Any) -> str:
+    serialized = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hit_ratio,
+        }
+
+class CacheBackend:
+    """
+    Key/value cache with size (`max_entries`) and age (`ttl_seconds`) eviction.
+    Values must be JSON serializable.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Any | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def _record_lookup(self, hit: bool) -> None:
+        if hit:
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+
+        logger.debug("Cache '%s' %s (hit ratio %.2f).", self.name, "hit" if hit else "miss", self.stats.hit_ratio)
+
+class MemoryCache(CacheBackend):
+    """
+    In-process LRU cache. Entries expire `ttl_seconds` after being stored.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float):
+        super().__init__(name, max_entries, ttl_seconds)
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.stats.evictions += 1
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+            self._record_lookup(entry is not None)
+            return entry[1] if entry is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteCache(CacheBackend):
+    """
+    On-disk cache stored in a SQLite database, so entries survive restarts.
+    The least recently used entries are evicted once `max_entries` is exceeded.
+    Values can be compressed with zstd; rows written with and without
+    compression can be read either way.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, path: str | Path, compression: str = CACHE_COMPRESSION_NONE):
+        super().__init__(name, max_entries, ttl_seconds)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if compression not in (CACHE_COMPRESSION_ZSTD, CACHE_COMPRESSION_NONE):
+            raise ValueError(f"Unknown cache compression for '{name}': {compression}")
+
+        self.compression = compression
+        self._compressor = zstandard.ZstdCompressor() if compression == CACHE_COMPRESSION_ZSTD else None
+        self._decompressor = zstandard.ZstdDecompressor()
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # Losing the last writes on a power failure is acceptable for a cache.
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS cache_entries_accessed_at ON cache_entries (accessed_at)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS cache_entries_created_at ON cache_entries (created_at)")
+        self._connection.commit()
+
+        self._eviction_interval = max(1, int(max_entries * SQLITE_EVICTION_INTERVAL_RATIO))
+        self._writes_since_eviction = 0
+
+    def _serialize(self, value: Any) -> bytes:
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        return self._compressor.compress(data) if self._compressor else data
+
+    def _deserialize(self, data: bytes) -> Any:
+        if bytes(data[:4]) == ZSTD_FRAME_MAGIC:
+            data = self._decompressor.decompress(data)
+
+        return json.loads(data)
+
+    def get(self, key: str) -> Any | None:
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, created_at FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                self._connection.commit()
+                self.stats.evictions += 1
+                row = None
+
+            if row is not None:
+                self._connection.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+                self._connection.commit()
+
+            self._record_lookup(row is not None)
+            return self._deserialize(row[0]) if row is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, self._serialize(value), now, now)
+            )
+
+            self._writes_since_eviction += 1
+            if self._writes_since_eviction >= self._eviction_interval:
+                self._writes_since_eviction = 0
+                self._evict(now)
+
+            self._connection.commit()
+
+    def _evict(self, now: float) -> None:
+        expired = self._connection.execute(
+            "DELETE FROM cache_entries WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        overflow = self._connection.execute(
+            "DELETE FROM cache_entries WHERE key IN ("
+            "SELECT key FROM cache_entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+
+        self.stats.evictions += expired + overflow
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM cache_entries")
+            self._connection.commit()
+
+class TieredCache(CacheBackend):
+    """
+    Small in-memory cache in front of a larger on-disk one. Entries found only
+    in the second level are copied to the first one.
+    """
+
+    def __init__(self, name: str, first_level: CacheBackend, second_level: CacheBackend):
+        super().__init__(name, first_level.max_entries, first_level.ttl_seconds)
+        self.first_level = first_level
+        self.second_level = second_level
+
+    def get(self, key: str) -> Any | None:
+        value = self.first_level.get(key)
+
+        if value is None:
+            value = self.second_level.get(key)
+            if value is not None:
+                self.first_level.set(key, value)
+
+        # Entries leaving the first level are still on disk, so only the second level really evicts.
+        self.stats.evictions = self.second_level.stats.evictions
+        self._record_lookup(value is not None)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.first_level.set(key, value)
+        self.second_level.set(key, value)
+        self.stats.evictions = self.second_level.stats.evictions
+
+    def clear(self) -> None:
+        self.first_level.clear()
+        self.second_level.clear()
+
+def _create_cache_level(name: str, cache_config: dict, base_folder: Path) -> CacheBackend | None:
+    backend = cache_config.get("backend", CACHE_BACKEND_NONE)
+    max_entries = cache_config.get("max_entries", 1024)
+    ttl_seconds = cache_config.get("ttl_seconds", 24 * 60 * 60)
+
+    if backend == CACHE_BACKEND_NONE:
+        return None
+    if backend == CACHE_BACKEND_MEMORY:
+        return MemoryCache(name, max_entries, ttl_seconds)
+    if backend == CACHE_BACKEND_SQLITE:
+        compression = cache_config.get("compression", CACHE_COMPRESSION_NONE)
+        return SQLiteCache(name, max_entries, ttl_seconds, base_folder / cache_config["sqlite_path"], compression)
+
+    raise ValueError(f"Unknown cache backend for '{name}': {backend}")
+
+def create_cache(name: str, cache_config: dict, base_folder: Path) -> CacheBackend | None:
+    """
+    Builds the cache backend described by a `cache_config` entry of `agent_config.yaml`.
+    An optional `disk` entry adds a second level behind it. Returns None when
+    the cache is disabled.
+    """
+    cache = _create_cache_level(name, cache_config, base_folder)
+    disk_cache = _create_cache_level(f"{name}_disk", cache_config["disk"], base_folder) if cache_config.get("disk") else None
+
+    if cache is None or disk_cache is None:
+        return cache or disk_cache
+
+    return TieredCache(name, cache, disk_cache)
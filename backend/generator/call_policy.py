@@ -0,0 +1,262 @@
+import asyncio
+import math
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential
+)
+
+from src.logger import logger
+
+from generator.metrics import LLM_RETRIES, HEDGED_CALLS
+from generator.rate_limit import RateLimiter, response_total_tokens
+
+# 408 Request Timeout, 429 Too Many Requests and the 5xx errors that are usually temporary.
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+LATENCY_WINDOW_SIZE = 200
+
+# Blocking calls run in their own threads so they can be timed out and hedged.
+MAX_BLOCKING_CALL_THREADS = 32
+
+def _status_code(error: BaseException) -> int | None:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code if isinstance(code, int) else None
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Timeouts, network errors and 408/429/5xx responses. The Gemini client wraps
+    the API errors, so the cause of the error is checked too.
+    """
+    for candidate in (error, error.__cause__):
+        if candidate is None:
+            continue
+        if isinstance(candidate, (TimeoutError, ConnectionError, httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)):
+            return True
+        if _status_code(candidate) in TRANSIENT_STATUS_CODES:
+            return True
+
+    return False
+
+def _retry_reason(error: BaseException) -> str:
+    if isinstance(error, TimeoutError):
+        return "timeout"
+
+    code = _status_code(error) or _status_code(error.__cause__ or error)
+    return str(code) if code else type(error).__name__
+
+class CallPolicy:
+    """
+    Timeout, retries and hedging of the LLM calls of one stage. The latencies of
+    the successful calls are kept to derive the hedging delay. With a
+    `rate_limiter`, every attempt first waits for its budget (outside of the
+    timeout) and hedges are only sent when there is budget to spare.
+    """
+
+    def __init__(self, stage: str, config: dict, rate_limiter: RateLimiter | None = None):
+        self.stage = stage
+        self.rate_limiter = rate_limiter
+        self.timeout: float = config["timeout_seconds"]
+        self.max_attempts: int = config["max_attempts"]
+        self.backoff_initial: float = config["backoff_initial_seconds"]
+        self.backoff_max: float = config["backoff_max_seconds"]
+        self.hedge: bool = config["hedge"]
+        self.hedge_quantile: float = config["hedge_quantile"]
+        self.hedge_min_samples: int = config["hedge_min_samples"]
+        self.hedge_min_delay: float = config["hedge_min_delay_seconds"]
+
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW_SIZE)
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> float | None:
+        """
+        Seconds to wait before sending a duplicate call, or None when hedging is
+        disabled or there are not enough latencies yet.
+        """
+        if not self.hedge or len(self._latencies) < self.hedge_min_samples:
+            return None
+
+        latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, max(0, math.ceil(self.hedge_quantile * len(latencies)) - 1))
+        return max(self.hedge_min_delay, latencies[index])
+
+    def _record_latency(self, started: float) -> None:
+        self._latencies.append(time.perf_counter() - started)
+
+    def _log_retry(self, retry_state: RetryCallState) -> None:
+        error = retry_state.outcome.exception()
+        LLM_RETRIES.inc(stage=self.stage, reason=_retry_reason(error))
+        logger.warning(
+            "LLM call of stage %s failed (attempt %s of %s), retrying in %.1fs: %s",
+            self.stage, retry_state.attempt_number, self.max_attempts, retry_state.next_action.sleep, error
+        )
+
+    def _retrying_options(self) -> dict[str, Any]:
+        return {
+            "stop": stop_after_attempt(self.max_attempts),
+            "wait": wait_random_exponential(multiplier=self.backoff_initial, max=self.backoff_max),
+            "retry": retry_if_exception(is_transient_error),
+            "before_sleep": self._log_retry,
+            "reraise": True,
+        }
+
+    def _thread_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=MAX_BLOCKING_CALL_THREADS, thread_name_prefix=f"llm-{self.stage}")
+            return self._executor
+
+    def _timed_call(self, function: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        result = function()
+        self._record_latency(started)
+        return result
+
+    def _can_hedge(self, tokens: int) -> bool:
+        if self.rate_limiter is None or self.rate_limiter.try_acquire(tokens):
+            return True
+
+        logger.debug("Not hedging a call of stage %s, no %s budget to spare.", self.stage, self.rate_limiter.provider)
+        return False
+
+    def _settle(self, tokens: int, result: Any) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(tokens, response_total_tokens(result))
+
+    def _attempt(self, function: Callable[[], Any], tokens: int) -> Any:
+        # A blocking call cannot be interrupted, so it runs in a worker thread and is
+        # abandoned (its result discarded) when it times out or loses to its hedge.
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(tokens)
+
+        executor = self._thread_executor()
+        deadline = time.monotonic() + self.timeout
+        hedge_delay = self.hedge_delay()
+        hedge_at = None if hedge_delay is None else time.monotonic() + hedge_delay
+
+        calls: dict[Future, str] = {executor.submit(self._timed_call, function): "primary"}
+        pending = set(calls)
+        error: BaseException | None = None
+
+        try:
+            while pending:
+                wake_at = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, pending = wait(pending, timeout=max(0, wake_at - time.monotonic()), return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future.exception() is None:
+                        self._record_hedge_winner(calls, future)
+                        return future.result()
+                    error = error or future.exception()
+
+                if not pending:
+                    break
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    if self._can_hedge(tokens):
+                        hedge = executor.submit(self._timed_call, function)
+                        calls[hedge] = "hedge"
+                        pending.add(hedge)
+                    hedge_at = None
+                elif time.monotonic() >= deadline:
+                    raise TimeoutError(f"LLM call of stage {self.stage} timed out after {self.timeout}s")
+
+            raise error
+        finally:
+            for future in calls:
+                future.cancel()
+
+    async def _atimed_call(self, function: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.perf_counter()
+        result = await function()
+        self._record_latency(started)
+        return result
+
+    async def _aattempt(self, function: Callable[[], Awaitable[Any]], tokens: int) -> Any:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(tokens)
+
+        deadline = time.monotonic() + self.timeout
+        hedge_delay = self.hedge_delay()
+        hedge_at = None if hedge_delay is None else time.monotonic() + hedge_delay
+
+        calls: dict[asyncio.Task, str] = {asyncio.create_task(self._atimed_call(function)): "primary"}
+        pending = set(calls)
+        error: BaseException | None = None
+
+        try:
+            while pending:
+                wake_at = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, pending = await asyncio.wait(pending, timeout=max(0, wake_at - time.monotonic()), return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    if task.exception() is None:
+                        self._record_hedge_winner(calls, task)
+                        return task.result()
+                    error = error or task.exception()
+
+                if not pending:
+                    break
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    if self._can_hedge(tokens):
+                        hedge = asyncio.create_task(self._atimed_call(function))
+                        calls[hedge] = "hedge"
+                        pending.add(hedge)
+                    hedge_at = None
+                elif time.monotonic() >= deadline:
+                    raise TimeoutError(f"LLM call of stage {self.stage} timed out after {self.timeout}s")
+
+            raise error
+        finally:
+            for task in calls:
+                task.cancel()
+
+    def _record_hedge_winner(self, calls: dict, winner: Any) -> None:
+        if len(calls) > 1:
+            HEDGED_CALLS.inc(stage=self.stage, winner=calls[winner])
+
+    def call(self, function: Callable[[], Any], tokens: int = 0) -> Any:
+        """
+        `tokens` is the estimated input of the call, reserved from the token
+        budget of the rate limiter.
+        """
+        result = Retrying(**self._retrying_options())(self._attempt, function, tokens)
+        self._settle(tokens, result)
+        return result
+
+    async def acall(self, function: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        result = await AsyncRetrying(**self._retrying_options())(self._aattempt, function, tokens)
+        self._settle(tokens, result)
+        return result
+
+class CallPolicies:
+    """
+    The `CallPolicy` of each stage, built from `call_policy_config`: the
+    "default" keys overridden by the keys of the stage. Every stage shares
+    `rate_limiter`, the budget of the LLM provider.
+    """
+
+    def __init__(self, call_policy_config: dict, rate_limiter: RateLimiter | None = None):
+        self.default_config: dict = call_policy_config["default"]
+        self.stages_config: dict = call_policy_config.get("stages") or {}
+        self.rate_limiter = rate_limiter
+        self._policies: dict[str, CallPolicy] = {}
+        self._lock = threading.Lock()
+
+    def get(self, stage: str) -> CallPolicy:
+        with self._lock:
+            if stage not in self._policies:
+                self._policies[stage] = CallPolicy(stage, {**self.default_config, **(self.stages_config.get(stage) or {})}, self.rate_limiter)
+            return self._policies[stage]
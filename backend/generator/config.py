@@ -3,9 +3,11 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 GENERATOR_FOLDER = Path(__file__).resolve().parent
-load_dotenv(GENERATOR_FOLDER.parent / "credentials.env")
+BACKEND_FOLDER = GENERATOR_FOLDER.parent
+load_dotenv(BACKEND_FOLDER / "credentials.env")
 
 GENERATOR_AGENT_CONFIG_PATH = GENERATOR_FOLDER / "agent_config.yaml"
+SLIDES_TEMPLATES_PATH = GENERATOR_FOLDER / "templates" / "slidesTemplates.json"
 SLIDE_INDEX_TITLE = 0
 SLIDE_INDEX_AGENDA = 1
 
@@ -15,4 +17,9 @@ def get_env(key: str, default: str | None = None) -> str:
         raise ValueError(f"Variável de ambiente obrigatória não configurada: {key}")
     return value
 
-TAVILY_API_KEY = get_env("TAVILY_API_KEY")
\ No newline at end of file
+def get_tavily_api_key() -> str:
+    """
+    Read when the Tavily client is created, so that the generator modules can be
+    imported (and run with other search clients) without the key.
+    """
+    return get_env("TAVILY_API_KEY")
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from pathlib import Path
+from typing import Any
+
+import zstandard
+
+from src.logger import logger
+
+from generator.cache import CacheStats, ZSTD_FRAME_MAGIC, CACHE_COMPRESSION_ZSTD, CACHE_COMPRESSION_NONE
+
+# The read time of a deck, which orders the evictions, is written at most once
+# per interval, so that repeated reads (e.g. polling with If-None-Match) do not
+# each cost a write.
+TOUCH_INTERVAL_SECONDS = 60
+
+def serialize_deck(value: Any) -> bytes:
+    """
+    Compact and deterministic JSON: the same deck always gives the same bytes,
+    and so the same ETag.
+    """
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+def deck_etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+class DeckStore:
+    """
+    Generated decks, stored in a SQLite database so they survive restarts.
+    Each deck is kept as compact JSON compressed with zstd, along with a
+    strong ETag of its content. Once the compressed decks exceed `max_bytes`
+    the least recently read ones are evicted. Every method blocks on SQLite:
+    async code calls them with `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int, compression: str = CACHE_COMPRESSION_ZSTD, name: str = "decks"):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if compression not in (CACHE_COMPRESSION_ZSTD, CACHE_COMPRESSION_NONE):
+            raise ValueError(f"Unknown deck store compression: {compression}")
+
+        self._compressor = zstandard.ZstdCompressor() if compression == CACHE_COMPRESSION_ZSTD else None
+        self._decompressor = zstandard.ZstdDecompressor()
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL a crash of the process loses nothing; only a power failure
+        # may lose the last saved decks.
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS decks ("
+            "id TEXT PRIMARY KEY, data BLOB NOT NULL, etag TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS decks_accessed_at ON decks (accessed_at)")
+        self._connection.commit()
+
+    def _decompress(self, data: bytes) -> bytes:
+        if bytes(data[:4]) == ZSTD_FRAME_MAGIC:
+            return self._decompressor.decompress(data)
+
+        return data
+
+    def save(self, deck_id: str, value: Any) -> str:
+        """
+        Stores the deck (replacing a previous version) and returns its ETag.
+        """
+        data = serialize_deck(value)
+        etag = deck_etag(data)
+        compressed = self._compressor.compress(data) if self._compressor else data
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO decks (id, data, etag, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (deck_id, compressed, etag, len(compressed), now, now)
+            )
+            self._evict(deck_id)
+            self._connection.commit()
+
+        return etag
+
+    def _evict(self, saved_id: str) -> None:
+        # Keeps the most recently read decks whose sizes add up to at most max_bytes,
+        # and always the deck just saved, even if it alone is larger than that.
+        evicted = self._connection.execute(
+            "DELETE FROM decks WHERE id IN ("
+            "SELECT id FROM (SELECT id, SUM(size) OVER (ORDER BY id = ? DESC, accessed_at DESC, id) AS total FROM decks) "
+            "WHERE total > ? AND id != ?)",
+            (saved_id, self.max_bytes, saved_id)
+        ).rowcount
+
+        if evicted:
+            self.stats.evictions += evicted
+            logger.info("Evicted %s decks from the deck store.", evicted)
+
+    def _touch(self, deck_id: str, accessed_at: float) -> None:
+        now = time.time()
+        if now - accessed_at < TOUCH_INTERVAL_SECONDS:
+            return
+
+        self._connection.execute("UPDATE decks SET accessed_at = ? WHERE id = ?", (now, deck_id))
+        self._connection.commit()
+
+    def load(self, deck_id: str) -> tuple[Any, str] | None:
+        """
+        The deck and its ETag, or None when there is no such deck.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT data, etag, accessed_at FROM decks WHERE id = ?", (deck_id,)).fetchone()
+            if row is not None:
+                self._touch(deck_id, row[2])
+
+            self.stats.hits += row is not None
+            self.stats.misses += row is None
+
+        return (json.loads(self._decompress(row[0])), row[1]) if row is not None else None
+
+    def etag(self, deck_id: str) -> str | None:
+        """
+        The ETag of the deck, without reading the deck itself.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT etag, accessed_at FROM decks WHERE id = ?", (deck_id,)).fetchone()
+            if row is not None:
+                self._touch(deck_id, row[1])
+
+            self.stats.hits += row is not None
+            self.stats.misses += row is None
+
+        return row[0] if row is not None else None
+
+    def size(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM decks").fetchone()[0]
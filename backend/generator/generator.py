@@ -1,84 +1,295 @@
 import json
+import threading
+import contextvars
 from time import sleep
+from typing import TYPE_CHECKING
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
 from pydantic import ValidationError
 from models.types import (
-    Slide, 
-    SlideTypeEnum, 
-    PresentationContent
+    Slide,
+    SlideTypeEnum,
+    PresentationContent,
+    StreamOrderEnum,
+    GenerationStrategyEnum,
+    DeckArtifacts
 )
 from models.templates import TEMPLATE_MODELS
 
 from src.logger import logger
 
 from generator.config import (
-    TAVILY_API_KEY,
+    get_tavily_api_key,
+    BACKEND_FOLDER,
     GENERATOR_AGENT_CONFIG_PATH,
-    SLIDE_INDEX_TITLE,
-    SLIDE_INDEX_AGENDA
+    SLIDES_TEMPLATES_PATH
 )
 from generator.utils import (
+    TEMPLATE_ID_AGENDA,
     read_yaml,
-    get_templates_descriptions,
     get_filled_templates_titles,
     get_introduction_slide,
     get_agenda_slide,
-    get_conclusion_slide,
+    build_static_slide,
+    CONCLUSION_SLIDE,
     streaming_new_slide_event,
     stream_introduction_slide,
     stream_agenda_slide,
     stream_conclusion_slide
 )
-
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage
-
-from tavily import TavilyClient
-
-class SlideGenerator:
-    def __init__(self):
-        logger.info("Initializing SlideGenerator...")
+from generator.cache import create_cache, make_cache_key, normalize_text
+from generator.deck_store import DeckStore
+from generator.singleflight import SingleFlight
+from generator.web_content import build_auxiliary_web_content
+from generator.template_registry import TemplateRegistry
+from generator.structured_output import build_slides_schema, template_json_schema, validate_structured_slide
+from generator.metrics import timed_stage, record_token_usage, track_cache, track_single_flight, LLM_CALLS, LLM_ESCALATIONS
+from generator.call_policy import CallPolicies
+from generator.rate_limit import RateLimiters, PROVIDER_GEMINI, PROVIDER_TAVILY, estimate_message_tokens
+
+# The LLM and search libraries are imported when their clients are first created (see
+# `BaseSlideGenerator.warm_up`): they account for most of the import time of the API.
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from tavily import TavilyClient
+
+# Suffix of the stage of the calls repeated with the default model after failing schema validation.
+ESCALATION_STAGE_SUFFIX = "_escalation"
+
+def model_name(llm) -> str:
+    return str(getattr(llm, "model", None) or type(llm).__name__).removeprefix("models/")
+
+def chat_messages(system_prompt: str, prompt: str) -> list:
+    from langchain_core.messages import SystemMessage, HumanMessage
+
+    return [SystemMessage(content=system_prompt), HumanMessage(content=prompt)]
+
+def _chain_future(source: Future, target: Future) -> None:
+    def copy_result(done: Future) -> None:
+        if done.cancelled():
+            target.cancel()
+        elif done.exception() is not None:
+            target.set_exception(done.exception())
+        else:
+            target.set_result(done.result())
+
+    source.add_done_callback(copy_result)
+
+class BaseSlideGenerator:
+    """
+    Configuration, prompt building and presentation assembly shared by the
+    synchronous and asynchronous generators. Subclasses only implement the
+    calls to the LLM and to the search API.
+    """
+
+    def __init__(self, llm: "ChatGoogleGenerativeAI | None" = None):
         self.agent_config = read_yaml(str(GENERATOR_AGENT_CONFIG_PATH))
 
         self.lesson_plan_prompt: str = self.agent_config["lesson_plan_prompt"]
         self.generate_presentation_prompt: str = self.agent_config["generate_presentation_prompt"]
+        self.generate_structured_presentation_prompt: str = self.agent_config["generate_structured_presentation_prompt"]
         self.fill_one_template_prompt: str = self.agent_config["fill_one_template_prompt"]
+        self.fill_templates_batch_prompt: str = self.agent_config["fill_templates_batch_prompt"]
+
+        self.max_concurrent_template_fills: int = self.agent_config["generation_config"]["max_concurrent_template_fills"]
+        self.generation_strategy = GenerationStrategyEnum(self.agent_config["generation_config"]["strategy"])
+        self.template_fill_batch_size: int = self.agent_config["generation_config"]["template_fill_batch_size"]
+        self.web_content_config: dict = self.agent_config["web_content_config"]
+        self.stream_slide_patches: bool = self.agent_config["streaming_config"]["slide_patches"]
+
+        # The agenda slide is always built by the generator, so it is never offered to the LLM.
+        self.templates_registry = TemplateRegistry(SLIDES_TEMPLATES_PATH, TEMPLATE_MODELS, internal_template_ids={TEMPLATE_ID_AGENDA})
+
+        # The clients are created on first use, or by `warm_up`.
+        self._clients_lock = threading.Lock()
+        self._llm_pool: dict[tuple, "ChatGoogleGenerativeAI"] = {}
+        self._llm = llm
+        self._stage_llms: dict | None = None
+        self._tavily_client = None
+
+        llm_config: dict = self.agent_config["llm_config"]
+        stages_llm_config: dict = llm_config.get("stages") or {}
+        self._llm_config = llm_config
+        # Models of the stages that override llm_config. An injected llm serves every stage.
+        self._stage_llm_configs: dict[str, dict] = {} if llm else {
+            stage: {**llm_config, **stage_config}
+            for stage, stage_config in stages_llm_config.items()
+            if stage_config and ({"model", "temperature"} & stage_config.keys())
+        }
+        self.escalating_stages: set[str] = {
+            stage for stage, stage_config in stages_llm_config.items()
+            if stage_config and stage_config.get("escalate") and stage in self._stage_llm_configs
+        }
+        self.rate_limiters = RateLimiters(self.agent_config["rate_limit_config"])
+        self.web_search_rate_limiter = self.rate_limiters.get(PROVIDER_TAVILY)
+        self.call_policies = CallPolicies(self.agent_config["call_policy_config"], self.rate_limiters.get(PROVIDER_GEMINI))
+
+        self.lesson_plan_cache = create_cache("lesson_plan", self.agent_config["cache_config"]["lesson_plan"], BACKEND_FOLDER)
+        self.web_search_cache = create_cache("web_search", self.agent_config["cache_config"]["web_search"], BACKEND_FOLDER)
+        self.template_fill_cache = create_cache("template_fill", self.agent_config["cache_config"]["template_fill"], BACKEND_FOLDER)
+
+        track_cache(self.lesson_plan_cache)
+        track_cache(self.web_search_cache)
+        track_cache(self.template_fill_cache)
+
+        deck_config: dict = self.agent_config["deck_config"]
+        self.deck_store = DeckStore(BACKEND_FOLDER / deck_config["sqlite_path"], deck_config["max_bytes"], deck_config["compression"])
+        track_cache(self.deck_store)
+
+    @staticmethod
+    def _create_llm(config: dict) -> "ChatGoogleGenerativeAI":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(
+            model=config["model"],
+            temperature=config["temperature"],
+            max_retries=config["max_retries"],
+        )
 
-        self.llm = ChatGoogleGenerativeAI(
-            model=self.agent_config["llm_config"]["model"],
-            temperature=self.agent_config["llm_config"]["temperature"],
+    def _create_tavily_client(self):
+        raise NotImplementedError
+
+    def _pooled_llm(self, config: dict) -> "ChatGoogleGenerativeAI":
+        """
+        One client per model configuration, shared by every stage that uses it.
+        """
+        key = (config["model"], config["temperature"], config["max_retries"])
+        with self._clients_lock:
+            if key not in self._llm_pool:
+                self._llm_pool[key] = self._create_llm(config)
+
+            return self._llm_pool[key]
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = self._pooled_llm(self._llm_config)
+
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm) -> None:
+        self._llm = llm
+
+    @property
+    def stage_llms(self) -> dict:
+        if self._stage_llms is None:
+            self._stage_llms = {stage: self._pooled_llm(config) for stage, config in self._stage_llm_configs.items()}
+
+        return self._stage_llms
+
+    @property
+    def tavilyClient(self):
+        if self._tavily_client is None:
+            with self._clients_lock:
+                if self._tavily_client is None:
+                    self._tavily_client = self._create_tavily_client()
+
+        return self._tavily_client
+
+    @tavilyClient.setter
+    def tavilyClient(self, tavily_client) -> None:
+        self._tavily_client = tavily_client
+
+    def warm_up(self) -> None:
+        """
+        Imports the LLM and search libraries and creates their clients, which
+        would otherwise happen during the first generation. Blocks for a few
+        seconds, so the API runs it in a thread at startup.
+        """
+        from generator.partial_output import parse_partial_object
+
+        chat_messages("", "")
+        parse_partial_object("{}")
+        self.llm
+        self.stage_llms
+        self.tavilyClient
+        logger.info("Generator clients created.")
+
+    def _stage_llm(self, stage: str):
+        llm = self.stage_llms.get(stage, self.llm)
+        LLM_CALLS.inc(stage=stage, model=model_name(llm))
+        return llm
+
+    def _escalation_stage(self, stage: str, error: Exception) -> str | None:
+        """
+        Stage of the call that repeats, with the default model, a call of `stage`
+        whose output failed schema validation. None when `stage` does not
+        escalate, or `error` is not a validation error.
+        """
+        from langchain_core.exceptions import OutputParserException
+
+        if stage not in self.escalating_stages or not isinstance(error, (ValidationError, OutputParserException)):
+            return None
+
+        LLM_ESCALATIONS.inc(stage=stage, model=model_name(self.stage_llms[stage]))
+        logger.warning(
+            "Output of %s failed schema validation in stage %s, calling %s: %s",
+            model_name(self.stage_llms[stage]), stage, model_name(self.llm), str(error).splitlines()[0]
+        )
+        return stage + ESCALATION_STAGE_SUFFIX
+
+    def _parse_structured_result(self, stage: str, result: dict):
+        """
+        Unpacks a `with_structured_output(..., include_raw=True)` result, recording
+        the token usage of the raw message before returning the parsed output.
+        """
+        record_token_usage(stage, result.get("raw"))
+
+        if result.get("parsing_error") is not None:
+            raise result["parsing_error"]
+
+        return result.get("parsed")
+
+    def _stage_model(self, stage: str) -> tuple:
+        """
+        The model and temperature that serve `stage`, so that a cache key only
+        changes with the settings that change the output of that stage.
+        """
+        llm_config = self._stage_llm_configs.get(stage, self._llm_config)
+        return llm_config.get("model"), llm_config.get("temperature")
+
+    def _lesson_plan_cache_key(self, class_topic: str, class_grade: str, class_additional_instructions: str) -> str:
+        return make_cache_key(
+            "lesson_plan",
+            normalize_text(class_topic),
+            normalize_text(class_grade),
+            normalize_text(class_additional_instructions),
+            self.lesson_plan_prompt,
+            self.web_content_config,
+            self._stage_model("lesson_plan")
         )
 
-        self.tavilyClient = TavilyClient(TAVILY_API_KEY)
-        logger.info("SlideGenerator initialized!")
+    def _lesson_plan_search_query(self, class_topic: str, class_grade: str) -> str:
+        return f"Preciso dar uma aula sobre o assunto '{class_topic}' para alunos do nível '{class_grade}', quero que você me traga uma lista de tópicos que são importantes referentes a esse assunto."
 
-    def generate_lesson_plan(self, class_topic: str, class_grade: str, class_additional_instructions: str) -> str:
-        logger.info("Generating lesson plan...")
-        auxiliary_web_content = self.tavilyClient.search(
-            query=f"Preciso dar uma aula sobre o assunto '{class_topic}' para alunos do nível '{class_grade}', quero que você me traga uma lista de tópicos que são importantes referentes a esse assunto.",
-            search_depth="advanced"
-        )
+    def _web_search_cache_key(self, query: str) -> str:
+        return make_cache_key("web_search", normalize_text(query))
+
+    def _cached_web_search(self, cache_key: str) -> dict | None:
+        if not self.web_search_cache:
+            return None
+
+        return self.web_search_cache.get(cache_key)
 
+    def _store_web_search(self, cache_key: str, auxiliary_web_content: dict) -> None:
+        if self.web_search_cache:
+            self.web_search_cache.set(cache_key, auxiliary_web_content)
+
+    def _lesson_plan_messages(self, class_topic: str, class_grade: str, class_additional_instructions: str, auxiliary_web_content) -> list:
         prompt = self.lesson_plan_prompt.format(
             class_topic=class_topic,
             class_grade=class_grade,
             class_additional_instructions=class_additional_instructions,
-            auxiliary_web_content=auxiliary_web_content
+            auxiliary_web_content=build_auxiliary_web_content(auxiliary_web_content, self.web_content_config)
         )
 
-        messages = [
-            SystemMessage(
-                content="Você é um especialista em educação e pedagogo com experiência em ensino. A partir das informações sobre a aula, gere um plano de aula detalhado, em tópicos, para um professor."
-            ),
-            HumanMessage(content=prompt),
-        ]
-
-        response = self.llm.invoke(messages)
-
-        return response.content
+        return chat_messages(
+            "Você é um especialista em educação e pedagogo com experiência em ensino. A partir das informações sobre a aula, gere um plano de aula detalhado, em tópicos, para um professor.",
+            prompt
+        )
 
-    def generate_presentation_content(self, lesson_plan: str, class_topic: str, templates_description: str, number_of_slides: int) -> list:
-        logger.info("Generating the presentation content...")
+    def _presentation_content_messages(self, lesson_plan: str, class_topic: str, templates_description: str, number_of_slides: int) -> list:
         prompt = self.generate_presentation_prompt.format(
             class_topic=class_topic,
             lesson_plan=lesson_plan,
@@ -86,34 +297,47 @@ class SlideGenerator:
             number_of_slides=number_of_slides
         )
 
-        messages = [
-            SystemMessage(
-                content="Você é um especialista em criação de apresentações. A partir do plano de aula recebido, divida o conteúdo em slides para uma apresentação."
-            ),
-            HumanMessage(content=prompt),
-        ]
+        return chat_messages(
+            "Você é um especialista em criação de apresentações. A partir do plano de aula recebido, divida o conteúdo em slides para uma apresentação.",
+            prompt
+        )
 
-        response = self.llm.with_structured_output(PresentationContent).invoke(messages)
+    def _structured_presentation_messages(self, lesson_plan: str, class_topic: str, templates_description: str, number_of_slides: int) -> list:
+        prompt = self.generate_structured_presentation_prompt.format(
+            class_topic=class_topic,
+            lesson_plan=lesson_plan,
+            templates_description=templates_description,
+            number_of_slides=number_of_slides
+        )
 
-        return [slide.model_dump() for slide in response.slides]
+        return chat_messages(
+            "Você é um especialista em criação de apresentações. A partir do plano de aula recebido, divida o conteúdo em slides para uma apresentação, preenchendo cada slide no formato do template escolhido.",
+            prompt
+        )
 
-    def generate_templates_content(self, slides_content: list[dict], class_topic: str) -> list[dict]:
-        filled_templates = []
-        
-        for slide in slides_content:
+    def _structured_slides_schema(self) -> dict:
+        return build_slides_schema(self.templates_registry.template_ids)
+
+    def _prefill_structured_slides(self, raw_slides: list) -> list[dict | None]:
+        """
+        Validates each slide of a one shot generation locally. Slides that fail
+        validation are returned as None so they can be filled individually.
+        """
+        prefilled = []
+        for position, raw_slide in enumerate(raw_slides):
             try:
-                filled = self.generate_one_template_content(slide, class_topic)
-                filled_templates.append(filled)
-            except Exception as e:
-                logger.error(f"Error generating template content for slide {slide.get('templateID')}: {e}")
-                continue
+                prefilled.append(validate_structured_slide(raw_slide))
+            except ValueError as e:
+                logger.warning("Structured slide %s failed validation, it will be filled individually: %s", position + 1, str(e).splitlines()[0])
+                prefilled.append(None)
 
-        return filled_templates
+        logger.info("%s of %s structured slides passed validation.", sum(filled is not None for filled in prefilled), len(prefilled))
+        return prefilled
 
-    def generate_one_template_content(self, slide_info: dict, class_topic: str) -> dict:
+    def _template_fill_request(self, slide_info: dict, class_topic: str) -> tuple[int, type, list]:
         template_id = slide_info.get("templateID")
         slide_content = slide_info.get("slideContent", slide_info)
-        
+
         TargetModel = TEMPLATE_MODELS.get(template_id)
 
         if not TargetModel:
@@ -125,92 +349,438 @@ class SlideGenerator:
             slide_content=slide_content
         )
 
-        messages = [
-            SystemMessage(
-                content="Você é um especialista em criação de apresentações. Estruture o conteúdo recebido para o formato do template solicitado."
-            ),
-            HumanMessage(content=prompt),
+        messages = chat_messages(
+            "Você é um especialista em criação de apresentações. Estruture o conteúdo recebido para o formato do template solicitado.",
+            prompt
+        )
+
+        return template_id, TargetModel, messages
+
+    def _template_fill_cache_key(self, slide_info: dict, class_topic: str) -> str | None:
+        template_id = slide_info.get("templateID")
+        TargetModel = TEMPLATE_MODELS.get(template_id)
+
+        if not TargetModel:
+            return None
+
+        return make_cache_key(
+            "template_fill",
+            template_id,
+            slide_info.get("slideContent", slide_info),
+            normalize_text(class_topic),
+            self.fill_one_template_prompt,
+            template_json_schema(TargetModel),
+            self._stage_model("template_fill")
+        )
+
+    def _store_template_fill(self, slide_info: dict, class_topic: str, filled_template: dict) -> None:
+        if self.template_fill_cache and (cache_key := self._template_fill_cache_key(slide_info, class_topic)):
+            self.template_fill_cache.set(cache_key, filled_template)
+
+    def _prefill_cached_template_fills(self, slides_content: list[dict], class_topic: str, prefilled: list[dict | None]) -> list[dict | None]:
+        """
+        Fills, from the template fill cache, the slides that are not filled yet.
+        They are then handled like the other prefilled slides: never sent to the
+        LLM and, when streaming, sent as soon as their position allows.
+        """
+        if not self.template_fill_cache:
+            return prefilled
+
+        prefilled = list(prefilled)
+        cached = 0
+        for position, slide in enumerate(slides_content):
+            if prefilled[position] is not None or not (cache_key := self._template_fill_cache_key(slide, class_topic)):
+                continue
+
+            if (filled_template := self.template_fill_cache.get(cache_key)) is not None:
+                prefilled[position] = filled_template
+                cached += 1
+
+        logger.info(
+            "%s of %s slides found in the template fill cache (hit ratio %.2f).",
+            cached, len(slides_content), self.template_fill_cache.stats.hit_ratio
+        )
+        return prefilled
+
+    def _template_fill_batches(self, slides_content: list[dict], prefilled: list[dict | None]) -> list[list[int]]:
+        """
+        Groups the positions of the slides that still need a template fill into
+        batches of `template_fill_batch_size`. Slides whose template has no model
+        are left out and filled individually (which reports the error).
+        """
+        pending = [
+            position for position, filled_template in enumerate(prefilled)
+            if filled_template is None and slides_content[position].get("templateID") in TEMPLATE_MODELS
         ]
 
-        response = self.llm.with_structured_output(TargetModel).invoke(messages)
+        batch_size = max(1, self.template_fill_batch_size)
+        batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
 
-        return {
-            "templateID": template_id,
-            "generationTemplate": response.model_dump()
-        }
+        return [batch for batch in batches if len(batch) > 1]
 
-    def generate_presentation(self, lesson_plan: str, class_topic: str, number_of_slides: int) -> list[Slide]:
-        templates_description = get_templates_descriptions()
-        presentation_content_array = self.generate_presentation_content(lesson_plan, class_topic, templates_description, number_of_slides)
+    @staticmethod
+    def _planned_slide_key(slide: dict) -> tuple:
+        """
+        Identifies a planned slide across two plannings of the same lesson
+        plan: its template and its title, since the rest of the planned text
+        is rarely repeated word for word.
+        """
+        content = slide.get("slideContent")
+        content = content if isinstance(content, dict) else {}
+        title = content.get("title") or next((value for value in content.values() if isinstance(value, str)), "")
 
-        logger.info("Filling presentation templates...")
-        
-        filled_templates = self.generate_templates_content(presentation_content_array, class_topic)
-        
+        return slide.get("templateID"), normalize_text(str(title))
+
+    def _template_batch_fill_request(self, slides: list[dict], class_topic: str) -> tuple[dict, list]:
+        slides_content = "\n\n".join(
+            f"[Slide {idx + 1}] templateID: {slide.get('templateID')}\n{slide.get('slideContent', slide)}"
+            for idx, slide in enumerate(slides)
+        )
+
+        prompt = self.fill_templates_batch_prompt.format(
+            class_topic=class_topic,
+            number_of_slides=len(slides),
+            slides_content=slides_content
+        )
+
+        messages = chat_messages(
+            "Você é um especialista em criação de apresentações. Estruture o conteúdo de cada slide recebido para o formato do template solicitado.",
+            prompt
+        )
+
+        template_ids = tuple(sorted({slide["templateID"] for slide in slides}))
+        return build_slides_schema(template_ids), messages
+
+    def _demultiplex_template_batch(self, slides: list[dict], response: dict | None) -> list[dict | None]:
+        """
+        Matches the slides of a batch response with the requested slides, by order
+        and template id. Members that are missing or fail validation are None.
+        """
+        raw_slides = (response or {}).get("slides") or []
+
+        filled_templates = []
+        for idx, slide in enumerate(slides):
+            raw_slide = raw_slides[idx] if idx < len(raw_slides) else None
+
+            try:
+                if not isinstance(raw_slide, dict) or raw_slide.get("templateID") != slide.get("templateID"):
+                    raise ValueError("Slide missing from the batch response")
+
+                filled_templates.append(validate_structured_slide(raw_slide))
+            except ValueError as e:
+                logger.warning("Batch slide %s failed validation, it will be filled individually: %s", idx + 1, str(e).splitlines()[0])
+                filled_templates.append(None)
+
+        logger.info("%s of %s batch slides passed validation.", sum(filled is not None for filled in filled_templates), len(slides))
+        return filled_templates
+
+    def _content_slide(self, filled_template: dict) -> Slide:
+        return Slide(
+            type=SlideTypeEnum.CONTENT,
+            title=filled_template["generationTemplate"]["title"],
+            content={
+                "templateID": filled_template["templateID"],
+                "templateContent": filled_template["generationTemplate"]
+            }
+        )
+
+    def introduction_slide(self, class_topic: str) -> Slide:
+        """
+        The title slide only depends on the topic, so it can be sent before
+        anything is generated.
+        """
+        return build_static_slide(SlideTypeEnum.TITLE, get_introduction_slide(class_topic, f"Apresentação sobre {class_topic}"))
+
+    def planned_llm_calls(self, number_of_slides: int) -> int:
+        """
+        Upper bound of the LLM calls of a generation: the lesson plan, the
+        presentation content and one template fill per content slide.
+        """
+        return 2 + number_of_slides
+
+    def save_deck(self, deck_id: str, artifacts: DeckArtifacts) -> str:
+        """
+        Keeps the intermediate results of a generation under `deck_id`, so that
+        the deck can be read again, a slide regenerated or the deck resized
+        without repeating the steps before it. Returns the ETag of the deck.
+        """
+        return self.deck_store.save(deck_id, artifacts.model_dump(mode="json"))
+
+    def load_deck(self, deck_id: str) -> tuple[DeckArtifacts, str] | None:
+        """
+        The artifacts of the deck and their ETag.
+        """
+        if (stored := self.deck_store.load(deck_id)) is None:
+            return None
+
+        artifacts, etag = stored
+        return DeckArtifacts.model_validate(artifacts), etag
+
+    def deck_presentation(self, artifacts: DeckArtifacts) -> list[Slide]:
+        filled_templates = [filled_template for filled_template in artifacts.filled_templates if filled_template is not None]
+        return self._assemble_presentation(filled_templates, artifacts.topic)
+
+    def _assemble_presentation(self, filled_templates: list[dict], class_topic: str) -> list[Slide]:
         logger.info("Adding mandatory slides (introduction, agenda and conclusion) to presentation...")
 
         templates_titles = get_filled_templates_titles(filled_templates)
 
-        introduction_slide = get_introduction_slide(class_topic, f"Apresentação sobre {class_topic}")
-        agenda_slide = get_agenda_slide(templates_titles)
-        conclusion_slide = get_conclusion_slide()
-        filled_templates = [introduction_slide, agenda_slide] + filled_templates + [conclusion_slide]
-
-        presentation = []
-        for idx, template in enumerate(filled_templates):
-
-            if idx == SLIDE_INDEX_TITLE:
-                template_type = "title"
-            elif idx == SLIDE_INDEX_AGENDA:
-                template_type = "agenda"
-            elif idx == len(filled_templates) - 1:
-                template_type = "conclusion"
-            else:
-                template_type = "content"
-
-            formatted_template = Slide(
-                type=SlideTypeEnum(template_type),
-                title=template["generationTemplate"]["title"],
-                content={
-                    "templateID": template["templateID"],
-                    "templateContent": template["generationTemplate"]
-                }
-            )
-            
-            presentation.append(formatted_template)
+        presentation = [
+            self.introduction_slide(class_topic),
+            build_static_slide(SlideTypeEnum.AGENDA, get_agenda_slide(templates_titles)),
+            *(self._content_slide(filled_template) for filled_template in filled_templates),
+            CONCLUSION_SLIDE
+        ]
 
         logger.info("Presentation generated!")
         return presentation
 
-    def generate_presentation_stream(self, lesson_plan: str, class_topic: str, number_of_slides: int):
-        yield from stream_introduction_slide(class_topic)
+class SlideGenerator(BaseSlideGenerator):
+    def __init__(self, llm: "ChatGoogleGenerativeAI | None" = None, tavily_client: "TavilyClient | None" = None):
+        logger.info("Initializing SlideGenerator...")
+        super().__init__(llm)
+
+        self._tavily_client = tavily_client
+        self.web_search_flight = SingleFlight()
+        track_single_flight("web_search", self.web_search_flight)
+        logger.info("SlideGenerator initialized!")
+
+    def _invoke_llm(self, stage: str, messages: list, schema=None):
+        """
+        Single entry point for the LLM calls: calls the model of `stage`
+        (`llm_config`), applies the call policy of the stage (rate limit,
+        timeout, retries and hedging), times the call and records its token
+        usage. With a `schema`, returns the parsed structured output; in stages
+        that escalate, an output that fails validation is requested again from
+        the default model.
+        """
+        llm = self._stage_llm(stage)
+
+        try:
+            return self._invoke_model(stage, llm, messages, schema)
+        except Exception as e:
+            if (escalation_stage := self._escalation_stage(stage, e)) is None:
+                raise
 
-        templates_description = get_templates_descriptions()
-        presentation_content_array = self.generate_presentation_content(lesson_plan, class_topic, templates_description, number_of_slides)
-        
-        templates_titles = []
+            return self._invoke_model(escalation_stage, self._stage_llm(escalation_stage), messages, schema)
+
+    def _create_tavily_client(self) -> "TavilyClient":
+        from tavily import TavilyClient
+
+        return TavilyClient(get_tavily_api_key())
+
+    def _invoke_model(self, stage: str, llm: "ChatGoogleGenerativeAI", messages: list, schema=None):
+        call_policy = self.call_policies.get(stage)
+        tokens = estimate_message_tokens(messages)
+
+        with timed_stage(stage):
+            if schema is None:
+                response = call_policy.call(lambda: llm.invoke(messages), tokens)
+                record_token_usage(stage, response)
+                return response
+
+            structured_llm = llm.with_structured_output(schema, include_raw=True)
+            result = call_policy.call(lambda: structured_llm.invoke(messages), tokens)
+            return self._parse_structured_result(stage, result)
+
+    def search_web_content(self, class_topic: str, class_grade: str) -> dict:
+        query = self._lesson_plan_search_query(class_topic, class_grade)
+        cache_key = self._web_search_cache_key(query)
+
+        if (auxiliary_web_content := self._cached_web_search(cache_key)) is not None:
+            logger.info("Web search results found in cache.")
+            return auxiliary_web_content
+
+        def search() -> dict:
+            if self.web_search_rate_limiter is not None:
+                self.web_search_rate_limiter.acquire()
+
+            with timed_stage("web_search"):
+                auxiliary_web_content = self.tavilyClient.search(query=query, search_depth="advanced")
+            self._store_web_search(cache_key, auxiliary_web_content)
+            return auxiliary_web_content
+
+        return self.web_search_flight.do(cache_key, search)
+
+    def generate_lesson_plan(self, class_topic: str, class_grade: str, class_additional_instructions: str) -> str:
+        cache_key = self._lesson_plan_cache_key(class_topic, class_grade, class_additional_instructions)
+        if self.lesson_plan_cache and (lesson_plan := self.lesson_plan_cache.get(cache_key)) is not None:
+            logger.info("Lesson plan found in cache.")
+            return lesson_plan
+
+        logger.info("Generating lesson plan...")
+        auxiliary_web_content = self.search_web_content(class_topic, class_grade)
+
+        messages = self._lesson_plan_messages(class_topic, class_grade, class_additional_instructions, auxiliary_web_content)
+
+        response = self._invoke_llm("lesson_plan", messages)
+
+        if self.lesson_plan_cache:
+            self.lesson_plan_cache.set(cache_key, response.content)
+
+        return response.content
+
+    def generate_presentation_content(self, lesson_plan: str, class_topic: str, templates_description: str, number_of_slides: int) -> list:
+        logger.info("Generating the presentation content...")
+        messages = self._presentation_content_messages(lesson_plan, class_topic, templates_description, number_of_slides)
+
+        response = self._invoke_llm("presentation_content", messages, PresentationContent)
+
+        return [slide.model_dump() for slide in response.slides]
+
+    def generate_structured_presentation_content(self, lesson_plan: str, class_topic: str, templates_description: str, number_of_slides: int) -> list:
+        logger.info("Generating the structured presentation content...")
+        messages = self._structured_presentation_messages(lesson_plan, class_topic, templates_description, number_of_slides)
+
+        response = self._invoke_llm("structured_presentation", messages, self._structured_slides_schema())
+
+        return [slide for slide in (response or {}).get("slides") or [] if isinstance(slide, dict)]
+
+    def _plan_presentation(self, lesson_plan: str, class_topic: str, number_of_slides: int, generation_strategy: GenerationStrategyEnum | None) -> tuple[list[dict], list[dict | None]]:
+        """
+        Returns the raw content of each slide and, for the slides that are already
+        in the format of their template, the filled template (None otherwise).
+        """
+        templates_description = self.templates_registry.descriptions
+
+        if (generation_strategy or self.generation_strategy) == GenerationStrategyEnum.ONE_SHOT:
+            slides_content = self.generate_structured_presentation_content(lesson_plan, class_topic, templates_description, number_of_slides)
+            return slides_content, self._prefill_structured_slides(slides_content)
+
+        slides_content = self.generate_presentation_content(lesson_plan, class_topic, templates_description, number_of_slides)
+        return slides_content, [None] * len(slides_content)
+
+    def _template_fill_executor(self, number_of_fills: int) -> ThreadPoolExecutor:
+        max_workers = max(1, min(self.max_concurrent_template_fills, number_of_fills))
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="template-fill")
+
+    def _submit_template_fills(self, executor: ThreadPoolExecutor, slides_content: list[dict], class_topic: str, prefilled: list[dict | None]) -> list[Future]:
+        futures: list[Future] = [Future() for _ in slides_content]
+        prefilled = self._prefill_cached_template_fills(slides_content, class_topic, prefilled)
+
+        # Worker threads do not inherit context variables, so each fill runs in a
+        # copy of the submitter's context to keep the per request timings.
+        def submit(function, *args) -> Future:
+            return executor.submit(contextvars.copy_context().run, function, *args)
+
+        def fill_individually(position: int) -> None:
+            _chain_future(submit(self.generate_one_template_content, slides_content[position], class_topic), futures[position])
+
+        def on_batch_done(batch: list[int], batch_future: Future) -> None:
+            try:
+                filled_templates = batch_future.result()
+            except Exception as e:
+                logger.error(f"Error generating template content for a batch of {len(batch)} slides: {e}")
+                filled_templates = [None] * len(batch)
+
+            for position, filled_template in zip(batch, filled_templates):
+                if filled_template is None:
+                    fill_individually(position)
+                else:
+                    futures[position].set_result(filled_template)
+
+        batches = self._template_fill_batches(slides_content, prefilled)
+        batched_positions = {position for batch in batches for position in batch}
+
+        for batch in batches:
+            batch_future = submit(self.generate_batch_templates_content, [slides_content[position] for position in batch], class_topic)
+            batch_future.add_done_callback(lambda done, batch=batch: on_batch_done(batch, done))
+
+        for position, filled_template in enumerate(prefilled):
+            if filled_template is not None:
+                futures[position].set_result(filled_template)
+            elif position not in batched_positions:
+                fill_individually(position)
+
+        return futures
+
+    def _collect_template_fills(self, futures: list[Future], slides_content: list[dict]) -> list[dict]:
         filled_templates = []
-        for idx, template in enumerate(presentation_content_array):
-            logger.info("Filling presentation template %s.", idx + 1)
-            
-            filled_template_dict = self.generate_one_template_content(template, class_topic)
-
-            templates_titles.append(filled_template_dict["generationTemplate"]["title"])
-            filled_templates.append(filled_template_dict)
-
-            new_slide_payload = Slide(
-                type=SlideTypeEnum("content"),
-                title=filled_template_dict["generationTemplate"]["title"],
-                content={
-                    "templateID": filled_template_dict["templateID"],
-                    "templateContent": filled_template_dict["generationTemplate"]
-                }
-            )
-
-            logger.info("Streaming slide %s.", idx + 1)
-            yield streaming_new_slide_event(new_slide_payload)
-        
-        yield from stream_agenda_slide(templates_titles)
+        for slide, future in zip(slides_content, futures):
+            try:
+                filled_templates.append(future.result())
+            except Exception as e:
+                logger.error(f"Error generating template content for slide {slide.get('templateID')}: {e}")
+                continue
+
+        return filled_templates
+
+    def generate_templates_content(self, slides_content: list[dict], class_topic: str) -> list[dict]:
+        if not slides_content:
+            return []
+
+        with self._template_fill_executor(len(slides_content)) as executor:
+            futures = self._submit_template_fills(executor, slides_content, class_topic, [None] * len(slides_content))
+            return self._collect_template_fills(futures, slides_content)
+
+    def generate_one_template_content(self, slide_info: dict, class_topic: str) -> dict:
+        template_id, TargetModel, messages = self._template_fill_request(slide_info, class_topic)
+
+        response = self._invoke_llm("template_fill", messages, TargetModel)
+
+        filled_template = {
+            "templateID": template_id,
+            "generationTemplate": response.model_dump()
+        }
+        self._store_template_fill(slide_info, class_topic, filled_template)
+
+        return filled_template
+
+    def generate_batch_templates_content(self, slides_info: list[dict], class_topic: str) -> list[dict | None]:
+        schema, messages = self._template_batch_fill_request(slides_info, class_topic)
+
+        response = self._invoke_llm("template_fill_batch", messages, schema)
+
+        return self._demultiplex_template_batch(slides_info, response)
+
+    def generate_presentation(self, lesson_plan: str, class_topic: str, number_of_slides: int, generation_strategy: GenerationStrategyEnum | None = None) -> list[Slide]:
+        slides_content, prefilled = self._plan_presentation(lesson_plan, class_topic, number_of_slides, generation_strategy)
+
+        logger.info("Filling presentation templates...")
+
+        with self._template_fill_executor(len(slides_content)) as executor:
+            futures = self._submit_template_fills(executor, slides_content, class_topic, prefilled)
+            filled_templates = self._collect_template_fills(futures, slides_content)
+
+        return self._assemble_presentation(filled_templates, class_topic)
+
+    def generate_presentation_stream(self, lesson_plan: str, class_topic: str, number_of_slides: int, stream_order: StreamOrderEnum = StreamOrderEnum.ORDERED, generation_strategy: GenerationStrategyEnum | None = None):
+        yield from stream_introduction_slide(class_topic)
+
+        slides_content, prefilled = self._plan_presentation(lesson_plan, class_topic, number_of_slides, generation_strategy)
+
+        executor = self._template_fill_executor(len(slides_content))
+        futures = self._submit_template_fills(executor, slides_content, class_topic, prefilled)
+
+        templates_titles: dict[int, str] = {}
+        try:
+            for position, filled_template_dict in self._completed_template_fills(futures, slides_content, stream_order):
+                templates_titles[position] = filled_template_dict["generationTemplate"]["title"]
+
+                logger.info("Streaming slide %s.", position + 1)
+                yield streaming_new_slide_event(self._content_slide(filled_template_dict), position=position)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        yield from stream_agenda_slide([templates_titles[position] for position in sorted(templates_titles)])
         yield from stream_conclusion_slide()
 
-        logger.info("Presentation generated!")
\ No newline at end of file
+        logger.info("Presentation generated!")
+
+    def _completed_template_fills(self, futures: list, slides_content: list[dict], stream_order: StreamOrderEnum):
+        """
+        Yields `(position, filled_template)` pairs, in the order of the slides or
+        as each fill finishes, depending on `stream_order`. In both, failed fills
+        are skipped.
+        """
+        positions = {future: position for position, future in enumerate(futures)}
+        completed = futures if stream_order == StreamOrderEnum.ORDERED else as_completed(positions)
+
+        for future in completed:
+            position = positions[future]
+
+            try:
+                yield position, future.result()
+            except Exception as e:
+                logger.error(f"Error generating template content for slide {slides_content[position].get('templateID')}: {e}")
+                continue
@@ -0,0 +1,323 @@
+"""
+Minimal Prometheus-style metrics (text exposition format) and per-request timing
+spans for the generation pipeline.
+"""
+import asyncio
+import math
+import threading
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in self.samples()]
+        return lines
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            values = dict(self._values)
+
+        for key, value in values.items():
+            yield self.name, dict(zip(self.label_names, key)), value
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._label_values(labels)] = value
+
+class CallbackMetric(Metric):
+    """
+    Metric whose samples are read from `callback` when rendered, for values that
+    are already tracked elsewhere (cache statistics, for instance).
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...], callback: Callable[[], dict[tuple[str, ...], float]], metric_type: str = "counter"):
+        super().__init__(name, documentation, label_names)
+        self.callback = callback
+        self.metric_type = metric_type
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        for key, value in self.callback().items():
+            yield self.name, dict(zip(self.label_names, key)), value
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = DURATION_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[idx] += 1
+            self._series[key] = [counts, total + value]
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+
+        for key, (counts, total) in series.items():
+            labels = dict(zip(self.label_names, key))
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count
+            yield f"{self.name}_count", labels, counts[-1]
+            yield f"{self.name}_sum", labels, total
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "slide_generator_stage_duration_seconds",
+    "Duration of each generation stage (web search, LLM calls).",
+    ("stage", "outcome")
+))
+LLM_INPUT_TOKENS = REGISTRY.register(Histogram(
+    "slide_generator_llm_input_tokens",
+    "Input tokens per LLM call, from the response usage metadata.",
+    ("stage",),
+    TOKEN_BUCKETS
+))
+LLM_OUTPUT_TOKENS = REGISTRY.register(Histogram(
+    "slide_generator_llm_output_tokens",
+    "Output tokens per LLM call, from the response usage metadata.",
+    ("stage",),
+    TOKEN_BUCKETS
+))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "slide_generator_http_request_duration_seconds",
+    "Time until the response of each HTTP request starts being sent.",
+    ("method", "path", "status")
+))
+LLM_CALLS = REGISTRY.register(Counter(
+    "slide_generator_llm_calls_total",
+    "LLM calls by stage and model (llm_config), retries and hedges not included.",
+    ("stage", "model")
+))
+LLM_ESCALATIONS = REGISTRY.register(Counter(
+    "slide_generator_llm_escalations_total",
+    "LLM calls whose output failed schema validation and were repeated with the default model, by stage and model of the failed call.",
+    ("stage", "model")
+))
+LLM_RETRIES = REGISTRY.register(Counter(
+    "slide_generator_llm_retries_total",
+    "LLM call attempts retried after a timeout or a transient error.",
+    ("stage", "reason")
+))
+HEDGED_CALLS = REGISTRY.register(Counter(
+    "slide_generator_hedged_calls_total",
+    "Duplicate LLM calls sent because the first one was slow, by the call that answered first.",
+    ("stage", "winner")
+))
+RATE_LIMIT_WAIT = REGISTRY.register(Histogram(
+    "slide_generator_rate_limit_wait_seconds",
+    "Time outbound calls waited for the request and token budget of their provider.",
+    ("provider",)
+))
+ADMISSIONS = REGISTRY.register(Counter(
+    "slide_generator_admissions_total",
+    "Generation requests by admission decision: admitted right away, queued until there was budget or rejected.",
+    ("decision",)
+))
+JOB_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "slide_generator_job_queue_depth",
+    "Generation jobs waiting for a worker."
+))
+JOBS_RUNNING = REGISTRY.register(Gauge(
+    "slide_generator_jobs_running",
+    "Generation jobs being run by a worker."
+))
+JOB_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "slide_generator_job_queue_wait_seconds",
+    "Time generation jobs waited in the queue before a worker picked them."
+))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    "slide_generator_jobs_finished_total",
+    "Generation jobs finished, by final status.",
+    ("status",)
+))
+SCHEDULER_WAIT = REGISTRY.register(Histogram(
+    "slide_generator_scheduler_wait_seconds",
+    "Time LLM and search calls of batch generations waited for a slot of the shared scheduler."
+))
+CLIENT_DISCONNECTS = REGISTRY.register(Counter(
+    "slide_generator_client_disconnects_total",
+    "Requests abandoned by the client before the generation finished.",
+    ("path",)
+))
+CANCELLED_CALLS = REGISTRY.register(Counter(
+    "slide_generator_cancelled_calls_total",
+    "LLM and search calls cancelled because their request was abandoned: already sent (wasted) or never sent (saved).",
+    ("stage", "outcome")
+))
+
+_tracked_caches: dict[str, Any] = {}
+_tracked_single_flights: dict[str, Any] = {}
+
+def track_cache(cache: Any) -> None:
+    """
+    Exports the statistics of a cache (see `generator.cache`) under its name.
+    """
+    if cache is not None:
+        _tracked_caches[cache.name] = cache
+
+def track_single_flight(name: str, single_flight: Any) -> None:
+    _tracked_single_flights[name] = single_flight
+
+REGISTRY.register(CallbackMetric(
+    "slide_generator_cache_lookups_total",
+    "Cache lookups by result.",
+    ("cache", "result"),
+    lambda: {
+        key: value
+        for name, cache in _tracked_caches.items()
+        for key, value in (((name, "hit"), cache.stats.hits), ((name, "miss"), cache.stats.misses))
+    }
+))
+REGISTRY.register(CallbackMetric(
+    "slide_generator_cache_evictions_total",
+    "Cache entries evicted by age or size.",
+    ("cache",),
+    lambda: {(name,): cache.stats.evictions for name, cache in _tracked_caches.items()}
+))
+REGISTRY.register(CallbackMetric(
+    "slide_generator_coalesced_calls_total",
+    "Calls that joined an identical call already in flight instead of starting a new one.",
+    ("call",),
+    lambda: {(name,): single_flight.coalesced for name, single_flight in _tracked_single_flights.items()}
+))
+
+class RequestTimings:
+    """
+    Timing spans recorded while serving a single request.
+    """
+
+    def __init__(self):
+        self.spans: list[tuple[str, float, float]] = []
+
+    def add(self, stage: str, start: float, end: float) -> None:
+        self.spans.append((stage, start, end))
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """
+        Per stage: number of calls and wall-clock time from the first start to the
+        last end, so concurrent calls of the same stage are not added up.
+        """
+        stages: dict[str, dict[str, float]] = {}
+        for stage, start, end in self.spans:
+            entry = stages.setdefault(stage, {"calls": 0, "start": start, "end": end})
+            entry["calls"] += 1
+            entry["start"] = min(entry["start"], start)
+            entry["end"] = max(entry["end"], end)
+
+        return {
+            stage: {"calls": entry["calls"], "duration": entry["end"] - entry["start"]}
+            for stage, entry in stages.items()
+        }
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            f'{stage};dur={entry["duration"] * 1000:.1f};desc="{int(entry["calls"])} calls"'
+            for stage, entry in self.summary().items()
+        )
+
+current_request_timings: ContextVar[RequestTimings | None] = ContextVar("current_request_timings", default=None)
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        CANCELLED_CALLS.inc(stage=stage, outcome="wasted")
+        raise
+    finally:
+        end = time.perf_counter()
+        STAGE_DURATION.observe(end - start, stage=stage, outcome=outcome)
+
+        request_timings = current_request_timings.get()
+        if request_timings is not None:
+            request_timings.add(stage, start, end)
+
+def record_token_usage(stage: str, message: Any) -> None:
+    usage = getattr(message, "usage_metadata", None) or {}
+
+    if "input_tokens" in usage:
+        LLM_INPUT_TOKENS.observe(usage["input_tokens"], stage=stage)
+    if "output_tokens" in usage:
+        LLM_OUTPUT_TOKENS.observe(usage["output_tokens"], stage=stage)
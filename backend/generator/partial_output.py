@@ -0,0 +1,55 @@
+from types import UnionType
+from typing import Any, Literal, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+def parse_partial_object(text: str) -> dict | None:
+    """
+    Parses the JSON object streamed so far, closing the strings, arrays and
+    objects that are still open. Returns None while nothing can be parsed.
+    """
+    from langchain_core.utils.json import parse_partial_json
+
+    try:
+        parsed = parse_partial_json(text.strip(), strict=False)
+    except ValueError:
+        return None
+
+    return parsed if isinstance(parsed, dict) else None
+
+def _placeholder(annotation: Any, value: Any) -> Any:
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+
+    if origin in (Union, UnionType):
+        if value is None and type(None) in args:
+            return None
+        return _placeholder(next(arg for arg in args if arg is not type(None)), value)
+    if origin is list:
+        items = value if isinstance(value, list) else []
+        return [_placeholder(args[0], item) for item in items] if args else items
+    if origin is Literal:
+        return value if value is not None else args[0]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        value = value if isinstance(value, dict) else {}
+        return {name: _placeholder(field.annotation, value.get(name)) for name, field in annotation.model_fields.items()}
+
+    if value is not None:
+        return value
+    if annotation is str:
+        return ""
+    if annotation in (int, float):
+        return 0
+    if annotation is bool:
+        return False
+
+    return None
+
+def complete_partial_template(model: type[BaseModel], partial: dict) -> dict:
+    """
+    Gives a partially generated template every field of `model`, with empty
+    values for the fields not generated yet, so that the frontend can render
+    it like a complete one. Length constraints are not enforced: the complete
+    output is validated against `model` once the generation ends.
+    """
+    return _placeholder(model, partial)
@@ -0,0 +1,270 @@
+import asyncio
+import math
+import threading
+import time
+import weakref
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from src.logger import logger
+
+from generator.metrics import RATE_LIMIT_WAIT, ADMISSIONS
+from generator.web_content import APPROXIMATE_CHARS_PER_TOKEN
+
+PROVIDER_GEMINI = "gemini"
+PROVIDER_TAVILY = "tavily"
+
+# Weight of the last call in the running average of tokens per call used to project budgets.
+TOKENS_PER_CALL_SMOOTHING = 0.1
+
+def estimate_message_tokens(messages: list) -> int:
+    """
+    Rough input token count of a list of chat messages, used to reserve token
+    budget before the call. The reservation is corrected with the usage
+    reported in the response.
+    """
+    return sum(len(str(getattr(message, "content", message))) for message in messages) // APPROXIMATE_CHARS_PER_TOKEN
+
+def response_total_tokens(response: Any) -> int | None:
+    """
+    Input plus output tokens of an LLM response, or of the raw message of a
+    `with_structured_output(..., include_raw=True)` result.
+    """
+    message = response.get("raw") if isinstance(response, dict) else response
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens")
+
+class TokenBucket:
+    """
+    Holds up to one minute of budget and refills continuously at `per_minute`.
+    Reservations may drive the balance negative: the caller then waits until
+    the bucket has refilled it, which keeps the waiters in reservation order.
+    Not thread safe, `RateLimiter` serializes the access.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.available = per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """
+        Seconds until `amount` would be available, without reserving it.
+        """
+        self._refill(now)
+        return max(0.0, (amount - self.available) / self.rate)
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        self.available -= amount
+        return max(0.0, -self.available / self.rate)
+
+    def refund(self, amount: float) -> None:
+        self.available = min(self.capacity, self.available + amount)
+
+class RateLimiter:
+    """
+    Outbound call budget of one provider: requests per minute and, optionally,
+    tokens (input plus output) per minute. Shared by every request served by
+    the process.
+    """
+
+    def __init__(self, provider: str, requests_per_minute: float, tokens_per_minute: float | None = None):
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.tokens_per_call = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            delay = self.requests.reserve(1, now)
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.reserve(tokens, now))
+
+        admission = current_admission.get()
+        if admission is not None and admission.limiter is self:
+            admission.consume()
+
+        return delay
+
+    def _refund(self, tokens: int) -> None:
+        with self._lock:
+            self.requests.refund(1)
+            if self.tokens is not None:
+                self.tokens.refund(tokens)
+
+    def _log_wait(self, delay: float) -> None:
+        RATE_LIMIT_WAIT.observe(delay, provider=self.provider)
+        if delay > 0:
+            logger.info("Waiting %.1fs for the %s rate limit.", delay, self.provider)
+
+    def acquire(self, tokens: int = 0) -> None:
+        delay = self._reserve(tokens)
+        self._log_wait(delay)
+        time.sleep(delay)
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        delay = self._reserve(tokens)
+        self._log_wait(delay)
+
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            # The call will never be made, so its budget goes back to the other requests.
+            self._refund(tokens)
+            raise
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """
+        Reserves the budget of a call only if it is available right now.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.requests.delay(1, now) > 0 or (self.tokens is not None and self.tokens.delay(tokens, now) > 0):
+                return False
+
+            self.requests.reserve(1, now)
+            if self.tokens is not None:
+                self.tokens.reserve(tokens, now)
+            return True
+
+    def settle(self, reserved_tokens: int, used_tokens: int | None) -> None:
+        """
+        Replaces the token estimate reserved before a call with the usage it
+        reported.
+        """
+        used_tokens = reserved_tokens if used_tokens is None else used_tokens
+
+        with self._lock:
+            if self.tokens is not None:
+                self.tokens.available -= used_tokens - reserved_tokens
+
+            if self.tokens_per_call:
+                self.tokens_per_call += TOKENS_PER_CALL_SMOOTHING * (used_tokens - self.tokens_per_call)
+            else:
+                self.tokens_per_call = used_tokens
+
+    def projected_delay(self, calls: int) -> float:
+        """
+        Seconds until the budget of `calls` more calls would be available,
+        assuming they use the average tokens per call seen so far.
+        """
+        now = time.monotonic()
+        with self._lock:
+            delay = self.requests.delay(calls, now)
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.delay(calls * self.tokens_per_call, now))
+            return delay
+
+class RateLimiters:
+    """
+    The `RateLimiter` of each provider of `rate_limit_config`. Providers
+    without an entry are not limited.
+    """
+
+    def __init__(self, rate_limit_config: dict):
+        self._limiters: dict[str, RateLimiter] = {
+            provider: RateLimiter(provider, config["requests_per_minute"], config.get("tokens_per_minute"))
+            for provider, config in (rate_limit_config or {}).items()
+            if config and config.get("requests_per_minute")
+        }
+
+    def get(self, provider: str) -> RateLimiter | None:
+        return self._limiters.get(provider)
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Not enough call budget, retry after {retry_after}s.")
+        self.retry_after = retry_after
+
+class Admission:
+    """
+    Calls still expected from an admitted request. Each call made while the
+    admission is active (see `active`) is deducted from them.
+    """
+
+    def __init__(self, controller: "AdmissionController", calls: int):
+        self.controller = controller
+        self.limiter = controller.limiter
+        self.remaining = calls
+
+    def consume(self) -> None:
+        self.remaining = max(0, self.remaining - 1)
+
+    def release(self) -> None:
+        self.remaining = 0
+        self.controller._admissions.discard(self)
+
+    @contextmanager
+    def active(self) -> Iterator["Admission"]:
+        token = current_admission.set(self)
+        try:
+            yield self
+        finally:
+            current_admission.reset(token)
+
+class AdmissionController:
+    """
+    Admits a new generation only when the projected budget of its calls, plus
+    the calls the requests admitted before it still have to make, is available
+    within `max_wait_seconds`.
+    """
+
+    def __init__(self, limiter: RateLimiter | None, max_wait_seconds: float):
+        self.limiter = limiter
+        self.max_wait_seconds = max_wait_seconds
+        # Admissions whose request was dropped without releasing them simply disappear from the set.
+        self._admissions: weakref.WeakSet[Admission] = weakref.WeakSet()
+
+    def committed_calls(self) -> int:
+        return sum(admission.remaining for admission in list(self._admissions))
+
+    def _retry_after(self, calls: int) -> int | None:
+        if self.limiter is None:
+            return None
+
+        excess = self.limiter.projected_delay(self.committed_calls() + calls) - self.max_wait_seconds
+        return max(1, math.ceil(excess)) if excess > 0 else None
+
+    def _admit(self, calls: int) -> Admission:
+        admission = Admission(self, calls)
+        self._admissions.add(admission)
+        return admission
+
+    def admit(self, calls: int) -> Admission:
+        """
+        Raises `AdmissionRejected` when the calls would wait too long for budget.
+        """
+        retry_after = self._retry_after(calls)
+        if retry_after is not None:
+            ADMISSIONS.inc(decision="rejected")
+            logger.warning("Rejecting a generation of %s calls, retry after %ss.", calls, retry_after)
+            raise AdmissionRejected(retry_after)
+
+        ADMISSIONS.inc(decision="admitted")
+        return self._admit(calls)
+
+    async def wait(self, calls: int) -> Admission:
+        """
+        Waits until the calls can be admitted.
+        """
+        queued = False
+        while (retry_after := self._retry_after(calls)) is not None:
+            if not queued:
+                logger.info("Holding a generation of %s calls for %ss until there is call budget.", calls, retry_after)
+                queued = True
+            await asyncio.sleep(retry_after)
+
+        ADMISSIONS.inc(decision="queued" if queued else "admitted")
+        return self._admit(calls)
+
+current_admission: ContextVar[Admission | None] = ContextVar("current_admission", default=None)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Iterator
+
+from generator.metrics import SCHEDULER_WAIT
+
+class FairScheduler:
+    """
+    Shares `max_concurrent_calls` outbound calls (LLM and search) among flows,
+    one per generation. A free slot goes to the flows with calls waiting in
+    turn, one call each, so that a generation with many template fills
+    pending does not hold back the others.
+    """
+
+    def __init__(self, max_concurrent_calls: int):
+        self.max_concurrent_calls = max(1, max_concurrent_calls)
+        self._active = 0
+        self._waiting: OrderedDict[ScheduledFlow, deque[asyncio.Future]] = OrderedDict()
+
+    def flow(self, shared: dict | None = None) -> "ScheduledFlow":
+        return ScheduledFlow(self, shared)
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(waiters) for waiters in self._waiting.values())
+
+    async def _acquire(self, flow: "ScheduledFlow") -> None:
+        if self._active < self.max_concurrent_calls and not self._waiting:
+            self._active += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(flow, deque()).append(waiter)
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over right before the cancellation.
+                self._release()
+            else:
+                self._discard(flow, waiter)
+            raise
+
+    def _discard(self, flow: "ScheduledFlow", waiter: asyncio.Future) -> None:
+        waiters = self._waiting.get(flow)
+        if waiters is None or waiter not in waiters:
+            return
+
+        waiters.remove(waiter)
+        if not waiters:
+            del self._waiting[flow]
+
+    def _release(self) -> None:
+        self._active -= 1
+
+        while self._active < self.max_concurrent_calls and self._waiting:
+            flow, waiters = next(iter(self._waiting.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._waiting.move_to_end(flow)
+            else:
+                del self._waiting[flow]
+
+            if not waiter.done():
+                waiter.set_result(None)
+                self._active += 1
+
+class ScheduledFlow:
+    """
+    The calls of one generation in a `FairScheduler`. `shared` holds the
+    results shared with the other flows of the same batch (see `share`).
+    """
+
+    def __init__(self, scheduler: FairScheduler, shared: dict | None = None):
+        self.scheduler = scheduler
+        self.shared: dict[Hashable, asyncio.Future] = shared if shared is not None else {}
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        start = time.perf_counter()
+        await self.scheduler._acquire(self)
+        SCHEDULER_WAIT.observe(time.perf_counter() - start)
+
+        try:
+            yield
+        finally:
+            self.scheduler._release()
+
+    async def share(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `function` once per `key` among the flows sharing `shared`. The
+        call is not cancelled when one of them goes away, only with the batch.
+        """
+        if key not in self.shared:
+            self.shared[key] = asyncio.ensure_future(function())
+
+        return await asyncio.shield(self.shared[key])
+
+    @contextmanager
+    def active(self) -> Iterator["ScheduledFlow"]:
+        token = current_flow.set(self)
+        try:
+            yield self
+        finally:
+            current_flow.reset(token)
+
+current_flow: ContextVar[ScheduledFlow | None] = ContextVar("current_flow", default=None)
+
+@asynccontextmanager
+async def scheduled_call() -> AsyncIterator[None]:
+    """
+    Holds a slot of the scheduler of the current flow, if any, during a call.
+    """
+    flow = current_flow.get()
+    if flow is None:
+        yield
+        return
+
+    async with flow.slot():
+        yield
+
+async def shared_call(key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+    flow = current_flow.get()
+    if flow is None:
+        return await function()
+
+    return await flow.share(key, function)
@@ -0,0 +1,77 @@
+from collections import defaultdict
+from functools import lru_cache
+from typing import Annotated, Any, Literal, Union
+
+from pydantic import BaseModel, Field, create_model
+
+from models.templates import TEMPLATE_MODELS
+
+def _to_gemini_schema(schema: Any) -> Any:
+    # Gemini supports "anyOf" but not "oneOf" nor the OpenAPI "discriminator" keyword;
+    # the templateID enums are enough to tell the variants apart.
+    if isinstance(schema, dict):
+        return {
+            "anyOf" if key == "oneOf" else key: _to_gemini_schema(value)
+            for key, value in schema.items()
+            if key != "discriminator"
+        }
+    if isinstance(schema, list):
+        return [_to_gemini_schema(value) for value in schema]
+
+    return schema
+
+@lru_cache(maxsize=None)
+def template_json_schema(TargetModel: type[BaseModel]) -> dict[str, Any]:
+    """
+    JSON schema of a template model. Pydantic builds it again on every
+    `model_json_schema()` call, which takes over a millisecond per template.
+    """
+    return TargetModel.model_json_schema()
+
+@lru_cache(maxsize=None)
+def build_slides_schema(template_ids: tuple[int, ...]) -> dict[str, Any]:
+    """
+    JSON schema of `{"slides": [...]}` where every slide is one of the concrete
+    `TEMPLATE_MODELS` of `template_ids`, discriminated by its `templateID`.
+    Templates that share a model are grouped into a single variant.
+    """
+    ids_by_model: dict[type[BaseModel], list[int]] = defaultdict(list)
+    for template_id in template_ids:
+        ids_by_model[TEMPLATE_MODELS[template_id]].append(template_id)
+
+    variants = [
+        create_model(
+            f"{TargetModel.__name__}Slide",
+            templateID=(Literal[tuple(ids)], Field(..., description="ID do template escolhido")),
+            slideContent=(TargetModel, Field(..., description="Conteúdo do slide no formato do template"))
+        )
+        for TargetModel, ids in ids_by_model.items()
+    ]
+
+    slide_type = variants[0] if len(variants) == 1 else Annotated[Union[tuple(variants)], Field(discriminator="templateID")]
+
+    StructuredPresentation = create_model(
+        "StructuredPresentation",
+        slides=(list[slide_type], Field(..., description="Lista de slides da apresentação"))
+    )
+
+    return _to_gemini_schema(StructuredPresentation.model_json_schema())
+
+def validate_structured_slide(raw_slide: dict[str, Any]) -> dict[str, Any]:
+    """
+    Validates a slide produced by a structured output call against the model of
+    its template. Returns it in the same format as a template fill, raises
+    ValueError (or pydantic's ValidationError) when it does not match.
+    """
+    template_id = raw_slide.get("templateID")
+    TargetModel = TEMPLATE_MODELS.get(template_id)
+
+    if not TargetModel:
+        raise ValueError(f"Model not found for template {template_id}")
+
+    generation_template = TargetModel.model_validate(raw_slide.get("slideContent"))
+
+    return {
+        "templateID": template_id,
+        "generationTemplate": generation_template.model_dump()
+    }
@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from src.logger import logger
+
+class TemplateRegistry:
+    """
+    In-memory index of `slidesTemplates.json`: the templates by id and the
+    description text sent to the LLM. The file is parsed once and parsed again
+    only when its modification time changes.
+    """
+
+    def __init__(self, templates_path: Path, template_models: dict[int, type[BaseModel]], internal_template_ids: set[int]):
+        self.templates_path = Path(templates_path)
+        self.template_models = template_models
+        self.internal_template_ids = internal_template_ids
+
+        self._lock = threading.Lock()
+        self._mtime: float | None = None
+        self._templates_by_id: dict[int, dict] = {}
+        self._descriptions = ""
+
+        self._load(self.templates_path.stat().st_mtime)
+
+    def _validate(self, templates_by_id: dict[int, dict]) -> None:
+        missing_models = sorted(set(templates_by_id) - set(self.template_models))
+        missing_templates = sorted(set(self.template_models) - set(templates_by_id) - self.internal_template_ids)
+
+        if missing_models or missing_templates:
+            raise ValueError(
+                f"Templates in {self.templates_path.name} and TEMPLATE_MODELS do not match. "
+                f"Without model: {missing_models}. Without template: {missing_templates}."
+            )
+
+    def _load(self, mtime: float) -> None:
+        with open(self.templates_path, "r", encoding="utf-8") as file:
+            templates = json.load(file)
+
+        templates_by_id = {template["id"]: template for template in templates}
+        if len(templates_by_id) != len(templates):
+            raise ValueError(f"Duplicated template ids in {self.templates_path.name}.")
+
+        self._validate(templates_by_id)
+
+        self._templates_by_id = templates_by_id
+        self._descriptions = "\n".join(f"{template['id']} - {template['templateDescription']}" for template in templates)
+        self._mtime = mtime
+        logger.info("Loaded %s slide templates from %s.", len(templates_by_id), self.templates_path.name)
+
+    def _reload_if_changed(self) -> None:
+        mtime = os.stat(self.templates_path).st_mtime
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+
+            try:
+                self._load(mtime)
+            except Exception as e:
+                logger.exception("Failed to reload slide templates, keeping the previous version: %s", e)
+                self._mtime = mtime
+
+    @property
+    def descriptions(self) -> str:
+        self._reload_if_changed()
+        return self._descriptions
+
+    @property
+    def template_ids(self) -> tuple[int, ...]:
+        self._reload_if_changed()
+        return tuple(self._templates_by_id)
+
+    def get(self, template_id: int) -> dict | None:
+        self._reload_if_changed()
+        return self._templates_by_id.get(template_id)
@@ -1,6 +1,6 @@
 import yaml
-import os
 import json
+import orjson
 import re
 import ast
 
@@ -8,7 +8,7 @@ from typing import Any
 from pathlib import Path
 
 from src.logger import logger
-from models.types import Slide, SlideTypeEnum
+from models.types import Slide, SlideContent, SlideTypeEnum
 
 TEMPLATE_ID_TITLE = 1
 TEMPLATE_ID_CONCLUSION = 1
@@ -117,15 +117,6 @@ def extract_dictionary(content: str) -> dict[str, Any] | None:
         logger.warning("Error extracting object...")
         return None
 
-def get_templates_descriptions() -> str:
-    slides = []
-    file_path = os.path.join(os.path.dirname(__file__), 'templates', 'slidesTemplates.json')
-
-    with open(file_path, 'r', encoding='utf-8') as file:
-        slides = json.load(file)
-        
-    return "\n".join(f"{slide['id']} - {slide['templateDescription']}" for slide in slides)
-
 def get_filled_templates_titles(filled_templates: list[dict]) -> list[str]:
     titles = []
     
@@ -164,52 +155,64 @@ def get_conclusion_slide() -> dict:
         }
     }
 
+def build_static_slide(slide_type: SlideTypeEnum, template: dict) -> Slide:
+    """
+    Slide of a template built by the generator itself (introduction, agenda
+    and conclusion), which skips the validation that LLM output goes through.
+    """
+    return Slide.model_construct(
+        type=slide_type,
+        title=template["generationTemplate"]["title"],
+        content=SlideContent.model_construct(templateID=template["templateID"], templateContent=template["generationTemplate"])
+    )
+
+# The same in every presentation, and never modified.
+CONCLUSION_SLIDE = build_static_slide(SlideTypeEnum.CONCLUSION, get_conclusion_slide())
+
 ### STREAMING AUXILIARY FUNCTIONS ###
 
-def streaming_new_slide_event(data: dict) -> str:
+def encode_json(data: Any) -> str:
+    """
+    JSON of an event, without spaces and with non ASCII characters as they are.
+    """
+    return orjson.dumps(data).decode("utf-8")
+
+def streaming_new_slide_event(data: dict, position: int | None = None) -> str:
     if hasattr(data, "model_dump"):
         data = data.model_dump()
 
-    return f"|NEW_SLIDE: {json.dumps(data, ensure_ascii=False)}|\n"
-    
+    if position is not None:
+        data = {**data, "position": position}
+
+    return f"|NEW_SLIDE: {encode_json(data)}|\n"
+
+def streaming_slide_patch_event(data: dict) -> str:
+    return f"|SLIDE_PATCH: {encode_json(data)}|\n"
+
+def streaming_progress_event(stage: str) -> str:
+    return f"|PROGRESS: {encode_json({'stage': stage})}|\n"
+
+def streaming_heartbeat_event() -> str:
+    return "|HEARTBEAT|\n"
+
+def streaming_error_event(message: str) -> str:
+    return f"|ERROR: {encode_json({'message': message})}|\n"
+
+def streaming_deck_event(data: dict) -> str:
+    return f"|DECK: {encode_json(data)}|\n"
+
+def streaming_job_status_event(data: dict) -> str:
+    return f"|JOB_STATUS: {encode_json(data)}|\n"
+
+CONCLUSION_SLIDE_EVENT = streaming_new_slide_event(CONCLUSION_SLIDE)
+
 def stream_introduction_slide(class_topic):
     introduction_slide = get_introduction_slide(class_topic, f"Apresentação sobre {class_topic}")
 
-    introduction_slide_payload = Slide(
-        type=SlideTypeEnum("title"),
-        title=introduction_slide["generationTemplate"]["title"],
-        content={
-            "templateID": introduction_slide["templateID"],
-            "templateContent": introduction_slide["generationTemplate"]
-        }
-    )
-    
-    yield streaming_new_slide_event(introduction_slide_payload)
+    yield streaming_new_slide_event(build_static_slide(SlideTypeEnum.TITLE, introduction_slide))
 
 def stream_agenda_slide(agenda_topics):
-    agenda_slide = get_agenda_slide(agenda_topics)
-
-    agenda_slide_payload = Slide(
-        type=SlideTypeEnum("agenda"),
-        title=agenda_slide["generationTemplate"]["title"],
-        content={
-            "templateID": agenda_slide["templateID"],
-            "templateContent": agenda_slide["generationTemplate"]
-        }
-    )
-    
-    yield streaming_new_slide_event(agenda_slide_payload)
+    yield streaming_new_slide_event(build_static_slide(SlideTypeEnum.AGENDA, get_agenda_slide(agenda_topics)))
 
 def stream_conclusion_slide():
-    conslusion_slide = get_conclusion_slide()
-
-    conslusion_slide_payload = Slide(
-        type=SlideTypeEnum("conclusion"),
-        title=conslusion_slide["generationTemplate"]["title"],
-        content={
-            "templateID": conslusion_slide["templateID"],
-            "templateContent": conslusion_slide["generationTemplate"]
-        }
-    )
-    
-    yield streaming_new_slide_event(conslusion_slide_payload)
\ No newline at end of file
+    yield CONCLUSION_SLIDE_EVENT
\ No newline at end of file
@@ -0,0 +1,117 @@
+import re
+
+from functools import lru_cache
+from typing import Any
+
+import tiktoken
+
+from src.logger import logger
+from generator.cache import normalize_text
+
+# Rough ratio used only when the tiktoken encoding cannot be loaded (e.g. offline hosts).
+APPROXIMATE_CHARS_PER_TOKEN = 4
+
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?;])\s+|\n+")
+MIN_PASSAGE_LENGTH = 20
+
+class TokenCounter:
+    def __init__(self, encoding_name: str):
+        self.encoding = None
+
+        try:
+            self.encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.warning("Could not load tiktoken encoding '%s', approximating token counts: %s", encoding_name, e)
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return len(text) // APPROXIMATE_CHARS_PER_TOKEN + 1
+
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+
+        if self.encoding is None:
+            return text[:max_tokens * APPROXIMATE_CHARS_PER_TOKEN]
+
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+@lru_cache(maxsize=None)
+def get_token_counter(encoding_name: str) -> TokenCounter:
+    return TokenCounter(encoding_name)
+
+def extract_passages(search_response: dict[str, Any]) -> list[tuple[str, str]]:
+    """
+    Returns `(source title, passage)` pairs from a Tavily search response, ranked
+    by the relevance score of their result. URLs, scores and other metadata are
+    dropped, and passages repeated across results are kept only once.
+    """
+    results = sorted(
+        search_response.get("results") or [],
+        key=lambda result: result.get("score") or 0,
+        reverse=True
+    )
+
+    passages = []
+    if search_response.get("answer"):
+        passages.append(("Resumo", search_response["answer"]))
+
+    seen: set[str] = set()
+    for result in results:
+        title = (result.get("title") or "").strip()
+
+        for sentence in SENTENCE_SPLIT_PATTERN.split(result.get("content") or ""):
+            sentence = sentence.strip()
+            normalized = normalize_text(sentence)
+
+            if len(normalized) < MIN_PASSAGE_LENGTH or normalized in seen:
+                continue
+
+            seen.add(normalized)
+            passages.append((title, sentence))
+
+    return passages
+
+def compact_web_content(search_response: dict[str, Any] | str, max_tokens: int, count_tokens: TokenCounter) -> str:
+    """
+    Turns a raw search response into plain text that fits in `max_tokens`,
+    keeping the most relevant passages grouped by source.
+    """
+    if not isinstance(search_response, dict):
+        return count_tokens.truncate(str(search_response), max_tokens)
+
+    sections: dict[str, list[str]] = {}
+    used_tokens = 0
+
+    for title, passage in extract_passages(search_response):
+        header_tokens = 0 if title in sections else count_tokens.count(f"{title}:\n")
+        passage_tokens = count_tokens.count(f"- {passage}\n")
+        remaining_tokens = max_tokens - used_tokens - header_tokens
+
+        if passage_tokens > remaining_tokens:
+            truncated = count_tokens.truncate(passage, remaining_tokens - 2)
+            if truncated:
+                sections.setdefault(title, []).append(truncated)
+            break
+
+        sections.setdefault(title, []).append(passage)
+        used_tokens += header_tokens + passage_tokens
+
+    return "\n".join(
+        f"{title}:\n" + "\n".join(f"- {passage}" for passage in passages)
+        for title, passages in sections.items()
+    )
+
+def build_auxiliary_web_content(search_response: dict[str, Any] | str, web_content_config: dict) -> str:
+    count_tokens = get_token_counter(web_content_config["tokenizer_encoding"])
+
+    compacted = compact_web_content(search_response, web_content_config["max_tokens"], count_tokens)
+
+    logger.info(
+        "Auxiliary web content compacted from %s to %s tokens.",
+        count_tokens.count(str(search_response)),
+        count_tokens.count(compacted)
+    )
+    return compacted
@@ -1,5 +1,6 @@
 from enum import Enum
-from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+from pydantic import BaseModel, Field, TypeAdapter, model_validator
 from typing import Optional, Any
 
 class SlideTypeEnum(str, Enum):
@@ -8,6 +9,20 @@ class SlideTypeEnum(str, Enum):
     CONTENT = "content"
     CONCLUSION = "conclusion"
 
+class StreamOrderEnum(str, Enum):
+    ORDERED = "ordered"
+    COMPLETION = "completion"
+
+class GenerationStrategyEnum(str, Enum):
+    PER_SLIDE = "per_slide"
+    ONE_SHOT = "one_shot"
+
+class JobStatusEnum(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 class SlideContentInput(BaseModel):
     templateID: int = Field(..., description="ID do template escolhido")
     slideContent: dict[str, Any] = Field(..., description="Conteúdo do slide baseado no templateID")
@@ -24,6 +39,8 @@ class SlideRequest(BaseModel):
     grade: str = Field(..., min_length=1, description="Education level")
     context: Optional[str] = Field(default="", description="Additional comments for generation")
     n_slides: int = Field(ge=1, le=30, description="Number of content slides (1 to 30)")
+    generation_strategy: Optional[GenerationStrategyEnum] = Field(default=None, description="How slides are planned and filled. Uses the server default when not provided")
+    stream_order: StreamOrderEnum = Field(default=StreamOrderEnum.ORDERED, description="Order in which /streaming emits content slides: presentation order or as soon as each one is ready")
 
 class OptionalQuestion(BaseModel):
     statement: str = Field(..., min_length=1, description="Question statement")
@@ -40,4 +57,41 @@ class OptionalQuestion(BaseModel):
 class Slide(BaseModel):
     type: SlideTypeEnum
     title: str = Field(..., min_length=1, description="Slide title")
-    content: SlideContent
\ No newline at end of file
+    content: SlideContent
+
+# Serializes a whole presentation in one pass, without the validation and conversions of a
+# FastAPI `response_model`.
+SLIDES_ADAPTER = TypeAdapter(list[Slide])
+
+class JobSlide(Slide):
+    position: Optional[int] = Field(default=None, description="Position among the content slides, None for the other slides")
+
+class DeckArtifacts(BaseModel):
+    topic: str
+    grade: str
+    context: Optional[str] = ""
+    generation_strategy: Optional[GenerationStrategyEnum] = None
+    web_search: Optional[dict[str, Any]] = Field(default=None, description="Search results behind the lesson plan, None when the lesson plan came from the cache")
+    lesson_plan: Optional[str] = None
+    slides_content: list[dict[str, Any]] = Field(default_factory=list, description="Planned content slides (templateID and raw slideContent), in presentation order")
+    filled_templates: list[Optional[dict[str, Any]]] = Field(default_factory=list, description="Filled template of each planned slide, None when its fill failed")
+
+class DeckResponse(BaseModel):
+    id: str = Field(..., description="Deck id")
+    slides: list[Slide] = Field(default_factory=list, description="Slides of the deck, in presentation order")
+
+class SlideRegenerationRequest(BaseModel):
+    template_id: Optional[int] = Field(default=None, description="Template of the regenerated slide. Keeps the current one when not provided")
+
+class DeckResizeRequest(BaseModel):
+    n_slides: int = Field(ge=1, le=30, description="New number of content slides (1 to 30)")
+
+class JobResponse(BaseModel):
+    id: str = Field(..., description="Job id")
+    status: JobStatusEnum
+    stage: Optional[str] = Field(default=None, description="Current stage of a running job: lesson_plan or slides")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    slides: list[JobSlide] = Field(default_factory=list, description="Slides generated so far, in presentation order")
+    error: Optional[str] = Field(default=None, description="Error message when the job failed")
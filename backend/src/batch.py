@@ -0,0 +1,93 @@
+import asyncio
+
+from typing import AsyncIterator
+
+from models.types import SlideRequest
+
+from src.logger import logger
+from src.jobs import Job
+from src.coalescing import generation_key
+
+from generator.async_generator import AsyncSlideGenerator
+from generator.rate_limit import AdmissionController
+from generator.scheduler import FairScheduler, ScheduledFlow
+from generator.utils import streaming_deck_event, streaming_heartbeat_event
+
+class SlideBatch:
+    """
+    The decks of a `POST /slides/batch` request. Each deck waits for call
+    budget like a job (see `AdmissionController.wait`) and its calls go
+    through the shared `FairScheduler`, in a flow of its own, so the decks of
+    every batch advance side by side within the scheduler's limit. Identical
+    requests of the batch share one generation, and its decks share their
+    web searches.
+    """
+
+    def __init__(
+        self,
+        requests: list[SlideRequest],
+        generator: AsyncSlideGenerator,
+        admission: AdmissionController,
+        scheduler: FairScheduler,
+        error_message: str,
+        heartbeat_seconds: float | None = None
+    ):
+        self.requests = requests
+        self.generator = generator
+        self.admission = admission
+        self.scheduler = scheduler
+        self.error_message = error_message
+        self.heartbeat_seconds = heartbeat_seconds
+
+        # Positions in `requests` of the requests served by each job.
+        self.jobs: dict[Job, list[int]] = {}
+        jobs_by_key: dict[str, Job] = {}
+        for index, request in enumerate(requests):
+            job = jobs_by_key.setdefault(generation_key(request), Job(request))
+            self.jobs.setdefault(job, []).append(index)
+
+    async def _run(self, job: Job, flow: ScheduledFlow) -> None:
+        admission = await self.admission.wait(self.generator.planned_llm_calls(job.request.n_slides))
+        try:
+            with admission.active(), flow.active():
+                await job.run(self.generator, self.error_message)
+        finally:
+            admission.release()
+
+    def _deck(self, index: int, job: Job) -> dict:
+        return {
+            "index": index,
+            "id": job.id,
+            "topic": job.request.topic,
+            "status": job.status.value,
+            "slides": [slide.model_dump(mode="json", exclude={"position"}) for slide in job.presentation()],
+            "error": job.error,
+        }
+
+    async def events(self) -> AsyncIterator[str]:
+        """
+        Generates every deck and yields a DECK event for each request as soon
+        as its deck is finished, with a HEARTBEAT while none finishes. Closing
+        the stream cancels the decks still being generated.
+        """
+        shared: dict = {}
+        tasks = {asyncio.create_task(self._run(job, self.scheduler.flow(shared))): job for job in self.jobs}
+        logger.info("Generating a batch of %s decks (%s distinct).", len(self.requests), len(tasks))
+
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self.heartbeat_seconds, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    yield streaming_heartbeat_event()
+                    continue
+
+                for task in done:
+                    job = tasks[task]
+                    for index in self.jobs[job]:
+                        yield streaming_deck_event(self._deck(index, job))
+        finally:
+            for task in tasks:
+                task.cancel()
+            for future in shared.values():
+                future.cancel()
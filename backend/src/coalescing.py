@@ -0,0 +1,139 @@
+import asyncio
+
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Iterator
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from models.types import SlideRequest, JobStatusEnum
+
+from src.logger import logger
+from src.jobs import Job, job_stream_events
+
+from generator.async_generator import AsyncSlideGenerator
+from generator.cache import make_cache_key, normalize_text
+from generator.rate_limit import Admission
+from generator.utils import streaming_error_event
+
+def generation_key(request: SlideRequest) -> str:
+    """
+    Requests with the same key (same topic, grade, context, number of slides,
+    strategy and stream order) produce the same generation.
+    """
+    return make_cache_key(
+        "generation",
+        normalize_text(request.topic),
+        normalize_text(request.grade),
+        normalize_text(request.context),
+        request.n_slides,
+        request.generation_strategy,
+        request.stream_order
+    )
+
+class GenerationCoalescer:
+    """
+    Identical concurrent requests (same topic, grade, context, number of
+    slides, strategy and stream order) share a single generation: the first
+    one starts it and the others follow it, replaying the slides already
+    generated. The generation is cancelled once every request following it
+    has gone away.
+    """
+
+    def __init__(self, generator: AsyncSlideGenerator, error_message: str, heartbeat_seconds: float | None = None):
+        self.generator = generator
+        self.error_message = error_message
+        self.heartbeat_seconds = heartbeat_seconds
+
+        self._jobs: dict[str, Job] = {}
+        self._tasks: dict[Job, asyncio.Task] = {}
+        self._followers: dict[Job, int] = {}
+        self.coalesced = 0
+
+    def _forget(self, key: str, job: Job) -> None:
+        if self._jobs.get(key) is job:
+            del self._jobs[key]
+
+    def _finished(self, key: str, job: Job) -> None:
+        self._forget(key, job)
+        self._tasks.pop(job, None)
+
+    async def _run(self, job: Job, admission: Admission) -> None:
+        try:
+            with admission.active():
+                await job.run(self.generator, self.error_message)
+        finally:
+            admission.release()
+
+    def join(self, request: SlideRequest, admit: Callable[[], Admission], slide_patches: bool = False) -> Job:
+        """
+        Returns the running generation of `request`, starting it (after
+        `admit`, which may raise) when there is none, with `slide_patches`
+        when it is started for a stream. Every `join` must be paired with a
+        `leave`.
+        """
+        key = generation_key(request)
+        job = self._jobs.get(key)
+
+        if job is None:
+            admission = admit()
+            job = Job(request, slide_patches)
+            self._jobs[key] = job
+            self._tasks[job] = task = asyncio.create_task(self._run(job, admission))
+            task.add_done_callback(lambda _: self._finished(key, job))
+        else:
+            self.coalesced += 1
+            logger.info("Request joined the running generation %s (%s slides already generated).", job.id, len(job.slides))
+
+        self._followers[job] = self._followers.get(job, 0) + 1
+        return job
+
+    def leave(self, job: Job) -> None:
+        self._followers[job] -= 1
+        if self._followers[job]:
+            return
+
+        del self._followers[job]
+        task = self._tasks.pop(job, None)
+        self._forget(generation_key(job.request), job)
+        if task is not None and not task.done():
+            logger.info("Every request left generation %s, cancelling it.", job.id)
+            task.cancel()
+
+    @contextmanager
+    def following(self, request: SlideRequest, admit: Callable[[], Admission]) -> Iterator[Job]:
+        job = self.join(request, admit)
+        try:
+            yield job
+        finally:
+            self.leave(job)
+
+    async def events(self, job: Job) -> AsyncIterator[str]:
+        """
+        Follows a joined generation with `job_stream_events`. A failed
+        generation ends with an ERROR event. Leaving the generation is up to
+        the caller (see `FollowerStreamingResponse`), since a stream that is
+        never iterated would never reach a `finally` here.
+        """
+        async for event in job_stream_events(job, self.heartbeat_seconds):
+            yield event
+
+        if job.status == JobStatusEnum.FAILED:
+            yield streaming_error_event(job.error)
+
+class FollowerStreamingResponse(StreamingResponse):
+    """
+    Streams a generation joined with `GenerationCoalescer.join` and leaves it
+    once the response is over, however it ends: also when its body was never
+    iterated, e.g. the client went away before the first event was sent.
+    """
+
+    def __init__(self, content: AsyncIterator[str], leave: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.leave = leave
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.leave()
@@ -0,0 +1,82 @@
+import asyncio
+
+from typing import AsyncIterator, Awaitable, TypeVar
+
+from starlette.requests import Request
+
+from src.logger import logger
+
+from generator.metrics import CLIENT_DISCONNECTS
+
+T = TypeVar("T")
+
+_STREAM_END = object()
+
+class ClientDisconnected(Exception):
+    pass
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+def _on_disconnect(request: Request, watcher: asyncio.Task, work: asyncio.Task) -> None:
+    # The watcher is cancelled once the work is over, which is not a disconnect.
+    if watcher.cancelled() or work.done():
+        return
+
+    logger.info("Client disconnected from %s, cancelling the generation.", request.url.path)
+    CLIENT_DISCONNECTS.inc(path=request.url.path)
+    work.cancel()
+
+async def run_until_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """
+    Awaits `awaitable` in its own task and cancels it as soon as the client
+    disconnects, raising `ClientDisconnected`.
+    """
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    watcher.add_done_callback(lambda done: _on_disconnect(request, done, work))
+
+    try:
+        return await work
+    except asyncio.CancelledError:
+        if watcher.done() and not watcher.cancelled():
+            raise ClientDisconnected()
+        raise
+    finally:
+        watcher.cancel()
+        work.cancel()
+
+async def stream_until_disconnect(request: Request, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Relays the events of `stream`, which runs in its own task. When the client
+    disconnects that task is cancelled right away, which closes `stream` and
+    cancels the LLM calls it started, instead of waiting for the next write to
+    the closed connection to fail.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def produce() -> None:
+        try:
+            async for event in stream:
+                events.put_nowait(event)
+        finally:
+            await stream.aclose()
+
+    producer = asyncio.create_task(produce())
+    producer.add_done_callback(lambda _: events.put_nowait(_STREAM_END))
+
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    watcher.add_done_callback(lambda done: _on_disconnect(request, done, producer))
+
+    try:
+        while (event := await events.get()) is not _STREAM_END:
+            yield event
+
+        if not producer.cancelled() and producer.exception() is not None:
+            raise producer.exception()
+    finally:
+        watcher.cancel()
+        producer.cancel()
@@ -0,0 +1,319 @@
+import asyncio
+import time
+import uuid
+
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from models.types import SlideRequest, JobSlide, JobResponse, JobStatusEnum, SlideTypeEnum, DeckArtifacts
+
+from src.logger import logger
+
+from generator.async_generator import AsyncSlideGenerator
+from generator.rate_limit import AdmissionController
+from generator.metrics import JOB_QUEUE_DEPTH, JOBS_RUNNING, JOB_QUEUE_WAIT, JOBS_FINISHED
+from generator.utils import (
+    streaming_new_slide_event,
+    streaming_job_status_event,
+    streaming_slide_patch_event,
+    streaming_progress_event,
+    streaming_heartbeat_event
+)
+
+# Stages reported while a job runs: searching and writing the lesson plan, then generating the slides.
+JOB_STAGE_LESSON_PLAN = "lesson_plan"
+JOB_STAGE_SLIDES = "slides"
+
+SLIDE_TYPE_ORDER = {
+    SlideTypeEnum.TITLE: 0,
+    SlideTypeEnum.AGENDA: 1,
+    SlideTypeEnum.CONTENT: 2,
+    SlideTypeEnum.CONCLUSION: 3,
+}
+
+class JobQueueFullError(Exception):
+    pass
+
+async def job_stream_events(job: "Job", heartbeat_seconds: float | None) -> AsyncIterator[str]:
+    """
+    Follows a job in the /streaming format: a PROGRESS event on each stage, a
+    NEW_SLIDE event per slide, SLIDE_PATCH events with the slides still being
+    filled and a HEARTBEAT while nothing else is sent.
+    """
+    async for update in job.follow(heartbeat_seconds):
+        if update is None:
+            yield streaming_heartbeat_event()
+        elif isinstance(update, str):
+            yield streaming_progress_event(update)
+        elif isinstance(update, dict):
+            yield streaming_slide_patch_event(update)
+        else:
+            yield streaming_new_slide_event(update.model_dump(exclude={"position"}), position=update.position)
+
+class Job:
+    """
+    A presentation generation, run by the job workers or shared by identical
+    concurrent requests (see `src.coalescing`). Slides are kept in the order
+    they were generated; `wait_for_change` returns on every update. Only jobs
+    with `slide_patches` record the content slides still being filled, since
+    that streams their template fills (see `streaming_config.slide_patches`).
+    """
+
+    def __init__(self, request: SlideRequest, slide_patches: bool = False):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.slide_patches = slide_patches
+        self.status = JobStatusEnum.QUEUED
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: datetime | None = None
+        self.finished_at: datetime | None = None
+        self.stage: str | None = None
+        self.lesson_plan: str | None = None
+        self.slides: list[JobSlide] = []
+        # Content slides still being filled (when slide patches are enabled), by position.
+        self.patches: dict[int, dict] = {}
+        self.error: str | None = None
+
+        self.enqueued_at = time.monotonic()
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatusEnum.COMPLETED, JobStatusEnum.FAILED)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def start(self) -> None:
+        self.status = JobStatusEnum.RUNNING
+        self.started_at = datetime.now(timezone.utc)
+        self._notify()
+
+    def set_stage(self, stage: str) -> None:
+        self.stage = stage
+        self._notify()
+
+    def add_slide(self, slide: JobSlide) -> None:
+        if slide.position is not None:
+            self.patches.pop(slide.position, None)
+
+        self.slides.append(slide)
+        self._notify()
+
+    def patch_slide(self, position: int, filled_template: dict) -> None:
+        """
+        Records the partially filled template of the content slide at `position`.
+        """
+        self.patches[position] = {
+            "type": SlideTypeEnum.CONTENT.value,
+            "title": filled_template["generationTemplate"].get("title") or "",
+            "content": {
+                "templateID": filled_template["templateID"],
+                "templateContent": filled_template["generationTemplate"]
+            },
+            "position": position
+        }
+        self._notify()
+
+    def finish(self, status: JobStatusEnum, error: str | None = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = datetime.now(timezone.utc)
+        self._notify()
+
+    async def wait_for_change(self) -> None:
+        await self._changed.wait()
+
+    async def wait_until_finished(self) -> None:
+        while not self.finished:
+            await self.wait_for_change()
+
+    async def follow(self, heartbeat_seconds: float | None = None) -> AsyncIterator[JobSlide | dict | str | None]:
+        """
+        Yields the current stage and the slides generated so far, then each
+        new stage and slide as they come, until the job finishes. Slides still
+        being filled are yielded as patch dicts (see `patch_slide`) whenever
+        they grow. With `heartbeat_seconds`, yields None whenever nothing
+        happened for that long.
+        """
+        sent = 0
+        sent_patches: dict[int, dict] = {}
+        stage = None
+        while True:
+            changed = self._changed
+            if self.stage != stage:
+                stage = self.stage
+                yield stage
+
+            while sent < len(self.slides):
+                sent += 1
+                yield self.slides[sent - 1]
+
+            for position, patch in list(self.patches.items()):
+                if sent_patches.get(position) is not patch:
+                    sent_patches[position] = patch
+                    yield patch
+
+            if self.finished:
+                return
+
+            try:
+                await asyncio.wait_for(changed.wait(), heartbeat_seconds)
+            except TimeoutError:
+                yield None
+
+    async def run(self, generator: AsyncSlideGenerator, error_message: str) -> None:
+        """
+        Generates the lesson plan and the slides of the request. The
+        introduction goes out right away, since it only depends on the topic.
+        A failure is logged and recorded with `error_message` as the error
+        shown to users. A completed generation keeps its artifacts under the
+        job id (see `save_deck`).
+        """
+        self.start()
+        logger.info("Job %s started.", self.id)
+
+        request = self.request
+        artifacts = DeckArtifacts(
+            topic=request.topic,
+            grade=request.grade,
+            context=request.context,
+            generation_strategy=request.generation_strategy
+        )
+        try:
+            self.set_stage(JOB_STAGE_LESSON_PLAN)
+            self.add_slide(JobSlide(**generator.introduction_slide(request.topic).model_dump()))
+
+            self.lesson_plan = await generator.generate_lesson_plan(request.topic, request.grade, request.context, artifacts)
+
+            self.set_stage(JOB_STAGE_SLIDES)
+            slides = generator.generate_presentation_slides(
+                lesson_plan=self.lesson_plan,
+                class_topic=request.topic,
+                number_of_slides=request.n_slides,
+                stream_order=request.stream_order,
+                generation_strategy=request.generation_strategy,
+                include_introduction=False,
+                on_slide_patch=self.patch_slide if self.slide_patches else None,
+                artifacts=artifacts
+            )
+            async with aclosing(slides):
+                async for slide, position in slides:
+                    self.add_slide(JobSlide(**slide.model_dump(), position=position))
+
+            await asyncio.to_thread(generator.save_deck, self.id, artifacts)
+        except asyncio.CancelledError:
+            self.finish(JobStatusEnum.FAILED, error_message)
+            raise
+        except Exception as e:
+            logger.exception("Job %s failed: %s", self.id, e)
+            self.finish(JobStatusEnum.FAILED, error_message)
+            return
+
+        self.finish(JobStatusEnum.COMPLETED)
+        logger.info("Job %s completed with %s slides.", self.id, len(self.slides))
+
+    def presentation(self) -> list[JobSlide]:
+        return sorted(self.slides, key=lambda slide: (SLIDE_TYPE_ORDER[slide.type], slide.position or 0))
+
+    def response(self) -> JobResponse:
+        return JobResponse(
+            id=self.id,
+            status=self.status,
+            stage=self.stage,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            slides=self.presentation(),
+            error=self.error
+        )
+
+class JobManager:
+    """
+    Runs the jobs of POST /jobs on a fixed number of worker tasks. Jobs wait in
+    a bounded queue, so a burst of requests is absorbed there instead of
+    starting every generation at once. A job only starts once `admission`
+    has call budget for it. Finished jobs are forgotten after
+    `result_ttl_seconds`.
+    """
+
+    def __init__(self, generator: AsyncSlideGenerator, admission: AdmissionController, workers: int, max_queued_jobs: int, result_ttl_seconds: float, error_message: str, heartbeat_seconds: float | None = None):
+        self.generator = generator
+        self.admission = admission
+        self.workers = workers
+        self.result_ttl_seconds = result_ttl_seconds
+        self.error_message = error_message
+        self.heartbeat_seconds = heartbeat_seconds
+
+        self._queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=max_queued_jobs)
+        self._jobs: dict[str, Job] = {}
+        self._worker_tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._worker_tasks = [asyncio.create_task(self._work(), name=f"job-worker-{idx}") for idx in range(self.workers)]
+        logger.info("Started %s job workers.", self.workers)
+
+    async def stop(self) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def _purge_finished_jobs(self) -> None:
+        now = datetime.now(timezone.utc)
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and (now - job.finished_at).total_seconds() > self.result_ttl_seconds
+        ]
+
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, request: SlideRequest) -> Job:
+        self._purge_finished_jobs()
+
+        job = Job(request)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullError(f"The job queue is full ({self._queue.maxsize} jobs).")
+
+        self._jobs[job.id] = job
+        JOB_QUEUE_DEPTH.set(self._queue.qsize())
+        logger.info("Job %s queued (%s waiting).", job.id, self._queue.qsize())
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        self._purge_finished_jobs()
+        return self._jobs.get(job_id)
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            JOB_QUEUE_DEPTH.set(self._queue.qsize())
+
+            admission = await self.admission.wait(self.generator.planned_llm_calls(job.request.n_slides))
+            JOB_QUEUE_WAIT.observe(time.monotonic() - job.enqueued_at)
+
+            JOBS_RUNNING.inc()
+            try:
+                with admission.active():
+                    await job.run(self.generator, self.error_message)
+            finally:
+                admission.release()
+                JOBS_RUNNING.inc(-1)
+                JOBS_FINISHED.inc(status=job.status.value)
+                self._queue.task_done()
+
+    async def events(self, job: Job) -> AsyncIterator[str]:
+        """
+        The events of `job_stream_events`, ending with a JOB_STATUS event once
+        the job finishes.
+        """
+        async for event in job_stream_events(job, self.heartbeat_seconds):
+            yield event
+
+        yield streaming_job_status_event({"status": job.status.value, "error": job.error})
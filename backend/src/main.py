@@ -1,16 +1,104 @@
 import os
-import time 
+import uuid
+import asyncio
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
 
-from models.types import SlideRequest, Slide
-from generator.generator import SlideGenerator
+from models.types import (
+    SlideRequest,
+    Slide,
+    SLIDES_ADAPTER,
+    JobResponse,
+    JobStatusEnum,
+    DeckArtifacts,
+    DeckResponse,
+    SlideRegenerationRequest,
+    DeckResizeRequest
+)
+from generator.async_generator import AsyncSlideGenerator
 
 from src.logger import logger
+from src.timing import ServerTimingMiddleware
+from src.disconnect import ClientDisconnected, run_until_disconnect, stream_until_disconnect
+from src.jobs import JobManager, JobQueueFullError
+from src.coalescing import GenerationCoalescer, FollowerStreamingResponse
+from src.batch import SlideBatch
+
+from generator.rate_limit import AdmissionController, AdmissionRejected, Admission
+from generator.scheduler import FairScheduler
+
+from generator.metrics import REGISTRY, track_single_flight
+
+slideGenerator = AsyncSlideGenerator()
+
+GENERIC_ERROR_MESSAGE: str = "Ocorreu um erro durante a geração, tente novamente."
+JOB_QUEUE_FULL_MESSAGE: str = "Muitas apresentações sendo geradas no momento, tente novamente em instantes."
+JOB_NOT_FOUND_MESSAGE: str = "Geração não encontrada."
+RATE_LIMITED_MESSAGE: str = "Muitas apresentações sendo geradas no momento, tente novamente em alguns segundos."
+DECK_NOT_FOUND_MESSAGE: str = "Apresentação não encontrada."
+SLIDE_NOT_FOUND_MESSAGE: str = "Slide não encontrado na apresentação."
+INVALID_TEMPLATE_MESSAGE: str = "Template inválido."
+DECK_CHANGED_MESSAGE: str = "A apresentação foi alterada desde a última leitura, carregue-a novamente."
+NOT_READY_MESSAGE: str = "O servidor ainda está iniciando, tente novamente em instantes."
+WARM_UP_FAILED_MESSAGE: str = "Não foi possível iniciar os clientes do Gemini e do Tavily."
+
+# Id of the deck of a generation, to edit it later with the /decks endpoints.
+DECK_ID_HEADER: str = "X-Deck-Id"
+
+admission_config: dict = slideGenerator.agent_config["admission_config"]
+admissionController = AdmissionController(
+    slideGenerator.rate_limiters.get(admission_config["provider"]),
+    max_wait_seconds=admission_config["max_wait_seconds"]
+)
+
+heartbeat_seconds: float = slideGenerator.agent_config["streaming_config"]["heartbeat_seconds"]
+
+jobs_config: dict = slideGenerator.agent_config["jobs_config"]
+jobManager = JobManager(
+    slideGenerator,
+    admissionController,
+    workers=jobs_config["workers"],
+    max_queued_jobs=jobs_config["max_queued_jobs"],
+    result_ttl_seconds=jobs_config["result_ttl_seconds"],
+    error_message=GENERIC_ERROR_MESSAGE,
+    heartbeat_seconds=heartbeat_seconds
+)
+
+generationCoalescer = GenerationCoalescer(slideGenerator, error_message=GENERIC_ERROR_MESSAGE, heartbeat_seconds=heartbeat_seconds)
+track_single_flight("generation", generationCoalescer)
+
+batch_config: dict = slideGenerator.agent_config["batch_config"]
+batchScheduler = FairScheduler(batch_config["max_concurrent_calls"])
+BATCH_SIZE_MESSAGE: str = f"Envie de 1 a {batch_config['max_requests']} apresentações por lote."
+
+# Creation of the LLM and search clients, started with the app (see /ready).
+warmUp: asyncio.Task | None = None
+
+async def warm_up_generator() -> bool:
+    try:
+        await asyncio.to_thread(slideGenerator.warm_up)
+    except Exception:
+        logger.exception("Failed to create the generator clients.")
+        return False
+
+    return True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global warmUp
+
+    jobManager.start()
+    # In the background, so that the worker starts serving right away.
+    warmUp = asyncio.create_task(warm_up_generator())
+    yield
+    await jobManager.stop()
 
-app = FastAPI(title="Slide Generator API")
+app = FastAPI(title="Slide Generator API", lifespan=lifespan)
 
 cors_origins: list[str] = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173").split(",")
 app.add_middleware(
@@ -19,53 +107,232 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After", "ETag", DECK_ID_HEADER],
 )
+app.add_middleware(ServerTimingMiddleware)
 
-slideGenerator = SlideGenerator()
+# Non standard status (popularized by nginx) for requests the client gave up on; it is never actually received.
+CLIENT_CLOSED_REQUEST_STATUS: int = 499
 
-GENERIC_ERROR_MESSAGE: str = "Ocorreu um erro durante a geração, tente novamente."
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected) -> Response:
+    return Response(status_code=CLIENT_CLOSED_REQUEST_STATUS)
+
+def admit(calls: int) -> Admission:
+    try:
+        return admissionController.admit(calls)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=RATE_LIMITED_MESSAGE, headers={"Retry-After": str(e.retry_after)})
+
+def admit_request(request: SlideRequest) -> Admission:
+    return admit(slideGenerator.planned_llm_calls(request.n_slides))
 
 @app.post("/slide", response_model=list[Slide])
-def generate_slides(request: SlideRequest):
+async def generate_slides(request: SlideRequest, http_request: Request) -> Response:
     """
     Endpoint que retorna o deck completo de slides de uma única vez.
+    Requisições idênticas simultâneas compartilham a mesma geração.
+    O id do deck, para editá-lo depois em /decks, vem no cabeçalho X-Deck-Id.
     """
-    try:
-        lesson_plan: str = slideGenerator.generate_lesson_plan(request.topic, request.grade, request.context)
-    except Exception as e:
-        logger.exception("Error generating lesson plan: %s", e)
-        raise HTTPException(status_code=500, detail=GENERIC_ERROR_MESSAGE)
+    with generationCoalescer.following(request, lambda: admit_request(request)) as job:
+        await run_until_disconnect(http_request, job.wait_until_finished())
 
-    try:
-        presentation: list[Slide] = slideGenerator.generate_presentation(
-            lesson_plan=lesson_plan,
-            class_topic=request.topic,
-            number_of_slides=request.n_slides
-        )
-    except ValueError as e:
-        logger.warning("Validation error while generating the presentation: %s", e)
-        raise HTTPException(status_code=422, detail=GENERIC_ERROR_MESSAGE)
-    except Exception as e:
-        logger.exception("Error generating presentation: %s", e)
+    if job.status != JobStatusEnum.COMPLETED:
         raise HTTPException(status_code=500, detail=GENERIC_ERROR_MESSAGE)
 
-    return presentation
+    return Response(SLIDES_ADAPTER.dump_json(job.presentation()), media_type="application/json", headers={DECK_ID_HEADER: job.id})
 
 @app.post("/streaming")
-def streaming_slides(request: SlideRequest) -> StreamingResponse:
+async def streaming_slides(request: SlideRequest, http_request: Request) -> StreamingResponse:
+    """
+    Endpoint que faz o streaming dos slides. O slide de introdução e o andamento da geração são enviados
+    imediatamente; erros durante a geração chegam como um evento ERROR no próprio stream.
+    Se o cliente se desconectar, a geração é interrompida.
+    Requisições idênticas simultâneas compartilham a mesma geração: quem chega depois recebe
+    primeiro os slides já gerados e depois acompanha os novos.
+    O id do deck, para editá-lo depois em /decks, vem no cabeçalho X-Deck-Id.
+    """
+    job = generationCoalescer.join(request, lambda: admit_request(request), slide_patches=True)
+
+    return FollowerStreamingResponse(
+        stream_until_disconnect(http_request, generationCoalescer.events(job)),
+        leave=lambda: generationCoalescer.leave(job),
+        media_type="text/plain",
+        headers={DECK_ID_HEADER: job.id}
+    )
+
+@app.post("/slides/batch")
+async def generate_slides_batch(requests: list[SlideRequest], http_request: Request) -> StreamingResponse:
+    """
+    Endpoint que gera várias apresentações em uma única requisição. Cada apresentação é enviada,
+    assim que fica pronta, em um bloco DECK com o índice do pedido, o status e os slides.
+    As chamadas de todas as apresentações dividem um limite global de chamadas simultâneas,
+    alternando entre as apresentações, e buscas iguais são feitas uma única vez.
+    Se o cliente se desconectar, as gerações ainda em andamento são interrompidas.
+    """
+    if not requests or len(requests) > batch_config["max_requests"]:
+        raise HTTPException(status_code=422, detail=BATCH_SIZE_MESSAGE)
+
+    batch = SlideBatch(requests, slideGenerator, admissionController, batchScheduler, GENERIC_ERROR_MESSAGE, heartbeat_seconds)
+
+    return StreamingResponse(stream_until_disconnect(http_request, batch.events()), media_type="text/plain")
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(request: SlideRequest) -> JobResponse:
+    """
+    Endpoint que agenda a geração de uma apresentação e retorna imediatamente o id da geração.
+    O resultado é consultado em /jobs/{job_id} ou acompanhado em /jobs/{job_id}/events.
+    """
+    try:
+        job = jobManager.submit(request)
+    except JobQueueFullError as e:
+        logger.warning("Rejecting job: %s", e)
+        raise HTTPException(status_code=503, detail=JOB_QUEUE_FULL_MESSAGE)
+
+    return job.response()
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str) -> JobResponse:
+    """
+    Endpoint que retorna o estado de uma geração e os slides gerados até o momento.
+    """
+    job = jobManager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=JOB_NOT_FOUND_MESSAGE)
+
+    return job.response()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, http_request: Request) -> StreamingResponse:
+    """
+    Endpoint que faz o streaming dos slides de uma geração, no mesmo formato de /streaming.
+    Se o cliente se desconectar, apenas o acompanhamento é interrompido, não a geração.
+    """
+    job = jobManager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=JOB_NOT_FOUND_MESSAGE)
+
+    return StreamingResponse(stream_until_disconnect(http_request, jobManager.events(job)), media_type="text/plain")
+
+def etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    """
+    `If-None-Match` uses the weak comparison (a W/ prefix is ignored) and
+    `If-Match` the strong one (a weak ETag never matches).
+    """
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    if weak:
+        candidates = [candidate.removeprefix("W/") for candidate in candidates]
+
+    return "*" in candidates or etag in candidates
+
+async def load_deck(deck_id: str, http_request: Request) -> DeckArtifacts:
+    """
+    The deck to be edited. With `If-Match`, the edit only goes ahead if the
+    deck is still the version the client read.
+    """
+    stored = await asyncio.to_thread(slideGenerator.load_deck, deck_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=DECK_NOT_FOUND_MESSAGE)
+
+    artifacts, etag = stored
+    if_match = http_request.headers.get("if-match")
+    if if_match and not etag_matches(if_match, etag, weak=False):
+        raise HTTPException(status_code=412, detail=DECK_CHANGED_MESSAGE, headers={"ETag": etag})
+
+    return artifacts
+
+def deck_response(deck_id: str, artifacts: DeckArtifacts, etag: str) -> Response:
+    deck = DeckResponse(id=deck_id, slides=slideGenerator.deck_presentation(artifacts))
+    return Response(
+        deck.model_dump_json(),
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache", DECK_ID_HEADER: deck_id}
+    )
+
+async def edit_deck(http_request: Request, calls: int, edit: Callable[[], Awaitable[DeckArtifacts]]) -> Response:
     """
-    Endpoint que faz o streaming dos slides.
+    Saves the edited deck under a new id: the original may be shared by every
+    requester of a coalesced generation, or by identical requests of a batch,
+    and stays as it was.
     """
+    admission = admit(calls)
     try:
-        lesson_plan: str = slideGenerator.generate_lesson_plan(request.topic, request.grade, request.context)
+        with admission.active():
+            artifacts = await run_until_disconnect(http_request, edit())
+    except ClientDisconnected:
+        raise
     except Exception as e:
-        logger.exception("Error generating lesson plan: %s", e)
+        logger.exception("Error editing the deck: %s", e)
         raise HTTPException(status_code=500, detail=GENERIC_ERROR_MESSAGE)
+    finally:
+        admission.release()
 
-    generator = slideGenerator.generate_presentation_stream(
-        lesson_plan=lesson_plan,
-        class_topic=request.topic,
-        number_of_slides=request.n_slides
-    )
+    deck_id = uuid.uuid4().hex
+    etag = await asyncio.to_thread(slideGenerator.save_deck, deck_id, artifacts)
+    return deck_response(deck_id, artifacts, etag)
+
+@app.get("/decks/{deck_id}", response_model=DeckResponse)
+async def get_deck(deck_id: str, http_request: Request) -> Response:
+    """
+    Endpoint que retorna um deck já gerado, sem gerá-lo de novo. A resposta traz o cabeçalho ETag;
+    com If-None-Match igual ao ETag atual a resposta é 304, sem corpo.
+    """
+    if_none_match = http_request.headers.get("if-none-match")
+    if if_none_match and (etag := await asyncio.to_thread(slideGenerator.deck_store.etag, deck_id)) is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    stored = await asyncio.to_thread(slideGenerator.load_deck, deck_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=DECK_NOT_FOUND_MESSAGE)
+
+    return deck_response(deck_id, *stored)
+
+@app.post("/decks/{deck_id}/slides/{position}", response_model=DeckResponse)
+async def regenerate_slide(deck_id: str, position: int, request: SlideRegenerationRequest, http_request: Request) -> Response:
+    """
+    Endpoint que gera novamente um slide de conteúdo de um deck (position é a posição entre os
+    slides de conteúdo, a partir de 0), opcionalmente com outro template. Reaproveita a pesquisa,
+    o plano de aula e a divisão em slides: custa uma única chamada à LLM. O deck editado é salvo
+    com um novo id (retornado no corpo e em X-Deck-Id), e o original não muda. Com If-Match
+    diferente do ETag atual do deck, a resposta é 412.
+    """
+    artifacts = await load_deck(deck_id, http_request)
+    if not 0 <= position < len(artifacts.slides_content):
+        raise HTTPException(status_code=404, detail=SLIDE_NOT_FOUND_MESSAGE)
+    if request.template_id is not None and request.template_id not in slideGenerator.templates_registry.template_ids:
+        raise HTTPException(status_code=422, detail=INVALID_TEMPLATE_MESSAGE)
+
+    return await edit_deck(http_request, 1, lambda: slideGenerator.regenerate_slide(artifacts, position, request.template_id))
 
-    return StreamingResponse(generator, media_type="text/plain")
\ No newline at end of file
+@app.post("/decks/{deck_id}/resize", response_model=DeckResponse)
+async def resize_deck(deck_id: str, request: DeckResizeRequest, http_request: Request) -> Response:
+    """
+    Endpoint que muda o número de slides de conteúdo de um deck. Reaproveita a pesquisa e o plano
+    de aula; a divisão em slides é refeita e só os slides novos (template e título que o deck não
+    tinha) são preenchidos.
+    Como na regeneração de um slide, o resultado é um novo deck e If-Match é respeitado.
+    """
+    artifacts = await load_deck(deck_id, http_request)
+    calls = slideGenerator.planned_llm_calls(request.n_slides) - 1
+
+    return await edit_deck(http_request, calls, lambda: slideGenerator.resize_presentation(artifacts, request.n_slides))
+
+@app.get("/ready")
+async def ready() -> dict:
+    """
+    Endpoint de prontidão: 200 quando os clientes do Gemini e do Tavily já foram criados e 503
+    enquanto o servidor ainda está iniciando, ou se a criação dos clientes falhou.
+    """
+    if warmUp is None or not warmUp.done():
+        raise HTTPException(status_code=503, detail=NOT_READY_MESSAGE, headers={"Retry-After": "1"})
+    if not warmUp.result():
+        raise HTTPException(status_code=503, detail=WARM_UP_FAILED_MESSAGE)
+
+    return {"status": "ready"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """
+    Métricas de latência por etapa, tokens por chamada ao LLM e estatísticas de cache, no formato do Prometheus.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,65 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.logger import logger
+
+from generator.metrics import HTTP_REQUEST_DURATION, RequestTimings, current_request_timings
+
+def _route_path(scope: Scope) -> str:
+    # The route template (e.g. "/decks/{deck_id}") keeps the metric labels bounded.
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope["path"]
+
+class ServerTimingMiddleware:
+    """
+    Collects the stage timings of each HTTP request. The stages finished before
+    the response starts are sent in a `Server-Timing` header, and the full
+    breakdown is logged when the request ends. /streaming starts its response
+    before any stage finishes, so its header only has the total; the stages of
+    its generation are logged with the request that started it.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_timings = RequestTimings()
+        token = current_request_timings.set(request_timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timings(message: Message) -> None:
+            nonlocal status
+
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - start
+                HTTP_REQUEST_DURATION.observe(elapsed, method=scope["method"], path=_route_path(scope), status=status)
+
+                server_timing = ", ".join(filter(None, [request_timings.server_timing(), f"total;dur={elapsed * 1000:.1f}"]))
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", server_timing.encode("latin-1"))]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            current_request_timings.reset(token)
+
+            if request_timings.spans:
+                logger.info(
+                    "%s %s %s finished in %.2fs. Stages: %s",
+                    scope["method"],
+                    scope["path"],
+                    status,
+                    time.perf_counter() - start,
+                    ", ".join(
+                        f"{stage}={entry['duration']:.2f}s ({int(entry['calls'])} calls)"
+                        for stage, entry in request_timings.summary().items()
+                    )
+                )
@@ -0,0 +1,37 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.stub_app import create_async_app
+
+from generator.deck_store import DeckStore
+
+from src import main
+
+def failing_call(*args, **kwargs):
+    raise RuntimeError("LLM unavailable")
+
+@pytest.mark.parametrize("path, payload, failing_method", [
+    ("/slides/0", {}, "generate_one_template_content"),
+    ("/resize", {"n_slides": 5}, "generate_presentation_content"),
+])
+def test_failed_deck_edit_answers_500(tmp_path, monkeypatch, path, payload, failing_method):
+    app = create_async_app(0)
+    monkeypatch.setattr(main.slideGenerator, "deck_store", DeckStore(tmp_path / "decks.sqlite3", max_bytes=1 << 20))
+
+    async def edit() -> tuple[httpx.Response, str]:
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                generated = await client.post("/slide", json={"topic": "Fotossíntese", "grade": "7", "n_slides": 4})
+                generated.raise_for_status()
+                deck_id = generated.headers[main.DECK_ID_HEADER]
+
+                monkeypatch.setattr(main.slideGenerator, failing_method, failing_call)
+                return await client.post(f"/decks/{deck_id}{path}", json=payload), deck_id
+
+    response, deck_id = asyncio.run(edit())
+
+    assert response.status_code == 500
+    assert response.json() == {"detail": main.GENERIC_ERROR_MESSAGE}
+    assert main.slideGenerator.deck_store.etag(deck_id) is not None
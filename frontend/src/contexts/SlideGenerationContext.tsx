@@ -67,6 +67,30 @@ export const SlideGenerationProvider: React.FC<{
     try {
       let firstSlideReceived = false;
       for await (const chunk of generateSlidesStream(request)) {
+        if (chunk.type == "patch") {
+          const position = chunk.content.position;
+          setSlides((prev) => {
+            const updatedSlides = prev.filter(
+              (slide) => !(slide.partial && slide.position === position),
+            );
+            const insertAt = updatedSlides.findIndex(
+              (slide) =>
+                slide.position !== undefined &&
+                position !== undefined &&
+                slide.position > position,
+            );
+            updatedSlides.splice(
+              insertAt === -1 ? updatedSlides.length : insertAt,
+              0,
+              chunk.content,
+            );
+            return updatedSlides;
+          });
+
+          // O conteúdo parcial não conta como um passo da geração.
+          continue;
+        }
+
         if (chunk.type == "slide") {
           if (chunk.content.type === "agenda") {
             setSlides((prev) => {
@@ -74,6 +98,23 @@ export const SlideGenerationProvider: React.FC<{
               updatedSlides.splice(1, 0, chunk.content);
               return updatedSlides;
             });
+          } else if (chunk.content.position !== undefined) {
+            const position = chunk.content.position;
+            setSlides((prev) => {
+              const updatedSlides = prev.filter(
+                (slide) => !(slide.partial && slide.position === position),
+              );
+              const insertAt = updatedSlides.findIndex(
+                (slide) =>
+                  slide.position !== undefined && slide.position > position,
+              );
+              updatedSlides.splice(
+                insertAt === -1 ? updatedSlides.length : insertAt,
+                0,
+                chunk.content,
+              );
+              return updatedSlides;
+            });
           } else {
             setSlides((prev) => [...prev, chunk.content]);
           }
@@ -110,6 +151,7 @@ export const SlideGenerationProvider: React.FC<{
       navigate("/");
       console.error(err);
     } finally {
+      setSlides((prev) => prev.filter((slide) => !slide.partial));
       setGenerationProgress({
         message: `Geração concluída!`,
         progress: 100,
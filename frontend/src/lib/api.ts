@@ -24,7 +24,7 @@ export async function generateSlides(request: SlideRequest): Promise<Slide[]> {
 
 export async function* generateSlidesStream(
   request: SlideRequest,
-): AsyncGenerator<{ type: "slide"; content: Slide }> {
+): AsyncGenerator<{ type: "slide" | "patch"; content: Slide }> {
   const response = await fetch("http://localhost:8000/streaming", {
     method: "POST",
     headers: {
@@ -64,6 +64,14 @@ export async function* generateSlidesStream(
         const json = chunk.replace("NEW_SLIDE:", "").trim();
         const slide: Slide = JSON.parse(json);
         yield { type: "slide", content: slide };
+      } else if (chunk.startsWith("SLIDE_PATCH:")) {
+        const json = chunk.replace("SLIDE_PATCH:", "").trim();
+        const slide: Slide = JSON.parse(json);
+        yield { type: "patch", content: { ...slide, partial: true } };
+      } else if (chunk.startsWith("ERROR:")) {
+        const json = chunk.replace("ERROR:", "").trim();
+        const error: { message?: string } = JSON.parse(json);
+        throw new Error(error.message || "Erro ao gerar slides (streaming)");
       }
     }
 
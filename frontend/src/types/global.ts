@@ -1,16 +1,21 @@
 export type SlideType = "title" | "agenda" | "content" | "conclusion";
 
+export type StreamOrder = "ordered" | "completion";
+
 export interface SlideRequest {
   topic: string;
   grade: string;
   context?: string;
   n_slides: number;
+  stream_order?: StreamOrder;
 }
 
 export interface Slide {
   type: SlideType;
   title: string;
   content: Record<string, unknown>;
+  position?: number;
+  partial?: boolean;
 }
 
 export interface OptionalQuestion {